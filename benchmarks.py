@@ -0,0 +1,254 @@
+import sys
+import json
+import time
+import string
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+import numpy as np
+
+import config
+import classes
+import helpers
+import experiments
+import parallel
+import store
+
+# Benchmarks of deliberations, partition algorithms, helpers and sweep cells:
+#
+#     python benchmarks.py run --output baseline.json
+#     python benchmarks.py run --output current.json --baseline baseline.json
+#     python benchmarks.py compare baseline.json current.json
+#
+# Every benchmark records the best and median wall time over a few runs, and the peak memory
+# allocated during one more run (measured with tracemalloc, which slows that run down).
+# A benchmark is flagged as a regression if it got slower, or used more memory, by more than
+# the tolerance; timings under a millisecond are left out of the comparison, as they are mostly noise.
+
+# (n, A, B, m): n agents, A items of evidence for the first alternative and B for every other one
+SCALES = {
+    'quick': [(10, 50, 30, 2), (100, 500, 300, 2), (30, 150, 90, 5)],
+    'full': [(10, 50, 30, 2), (100, 500, 300, 2), (1000, 5000, 3000, 2), (30, 150, 90, 5), (100, 500, 300, 10)]
+}
+
+SWEEP_TRIALS = {'quick': 50, 'full': 500}
+
+def alternatives(m) -> list:
+    return list(string.ascii_lowercase[:m]) if m <= 26 else ['x{k}'.format(k = k) for k in range(m)]
+
+def countProfile(n, A, B, m, seed=0):
+    """
+        Returns an integer array of shape (n, m): A items of evidence for the first alternative,
+        and B for every other one, are each spread uniformly at random among n agents.
+    """
+    rng = np.random.default_rng(seed)
+    return np.stack([rng.multinomial(A if k == 0 else B, [1/n]*n) for k in range(m)], axis=1)
+
+def buildProfile(Counts, agentType, Context, explicit=False):
+    """
+        Profile of agents of type agentType with the amounts of evidence in Counts; if explicit,
+        agents are given their items of evidence, rather than numbers.
+    """
+    agents = []
+    for j, row in enumerate(Counts.tolist()):
+        evidence = {x:c for x, c in zip(Context.Alternatives, row)}
+        if explicit:
+            evidence = helpers.generateEvidenceFromCounts(evidence, j+1, Context)
+        agents.append(classes.Agent(id = j+1, evidence = evidence, type = agentType, Context = Context))
+    return classes.Profile(agents, Context)
+
+def deliberationBenchmarks(size):
+    for n, A, B, m in SCALES[size]:
+        Context = config.Context(alternatives(m))
+        counts = countProfile(n, A, B, m)
+        for protocol in ['sim', 'seq-const']:
+            for agentType in ['lazy', 'keen']:
+                for engine in ['sets', 'counts']:
+                    params = dict(protocol=protocol, agentType=agentType, engine=engine, n=n, A=A, B=B, m=m)
+                    setup = lambda agentType=agentType, Context=Context, counts=counts: buildProfile(counts, agentType, Context)
+                    run = lambda P, protocol=protocol, engine=engine: classes.Deliberation(P, protocol, engine, HistoryLevel='none')
+                    yield 'deliberation', params, setup, run
+
+def partitionBenchmarks(size):
+    for n, A in dict.fromkeys((n, A) for n, A, B, m in SCALES[size]): # the number of alternatives plays no part
+        draws = max(5, (2000 if size == 'quick' else 20000)//n) # the random walks of randomIncrement and randomDeviate take O(n) steps or more
+        shares = (A//n-2, A//n+2, A//n-1)
+        for k, alg in experiments.CONTEXT.PARTITION_ALGS.items():
+            params = dict(alg=alg.__name__, n=n, S=A, shares=shares, draws=draws)
+            run = lambda _, alg=alg, n=n, A=A, shares=shares, draws=draws: [alg(A, n, *shares) for _ in range(draws)]
+            yield 'partition', params, lambda: None, run
+        for k, alg in experiments.CONTEXT.BATCH_PARTITION_ALGS.items():
+            params = dict(alg=alg.__name__, n=n, S=A, shares=shares, draws=draws)
+            run = lambda rng, alg=alg, n=n, A=A, shares=shares, draws=draws: alg(A, n, *shares, trials=draws, rng=rng)
+            yield 'partition', params, lambda: np.random.default_rng(0), run
+
+def helperBenchmarks(size):
+    for n, A, B, m in SCALES[size]:
+        Context = config.Context(alternatives(m))
+        counts = countProfile(n, A, B, m)
+        outcome = set(Context.Alternatives[1:]) # alternatives other than the one with most evidence
+        publicEvidence = {x:set() for x in Context.Alternatives}
+        setup = lambda Context=Context, counts=counts: buildProfile(counts, 'keen', Context, explicit=True)
+        yield 'pluralityWinners', dict(n=n, A=A, B=B, m=m), setup, helpers.pluralityWinners
+        run = lambda P, outcome=outcome, publicEvidence=publicEvidence: helpers.thereIsSomethingToDisclose(P, outcome, publicEvidence)
+        yield 'thereIsSomethingToDisclose', dict(n=n, A=A, B=B, m=m), setup, run
+
+def sweepCells(trials) -> dict:
+    """
+        One cell of every sweep in experiments, at a representative point, with fewer trials.
+    """
+    a, b = experiments.a, experiments.b
+    alg = experiments.CONTEXT.BATCH_PARTITION_ALGS[4]
+    n, A, B = 10, 60, 30
+    lazy = [('sim', 'lazy'), ('seq-const', 'lazy')]
+    common = dict(n=n, A=A, B=B, alg=alg, trials=trials, Context=experiments.CONTEXT)
+    gap = {a:(1, 1, 1), b:(3, 7, 1)}
+    return {
+        'protocolsDifferentN': dict(
+            common, aShares=((A//n)-2, (A//n)+2, (A//n)-1), bShares=((B//n)-2, (A//n)+2, (B//n)-1), evaluations=lazy
+            ),
+        'evidenceGap': dict(
+            common, aShares=((A//n)-6, (A//n)+6, (A//n)-1), bShares=((B//n)-2, (B//n)+2, (B//n)-1), evaluations=[('seq-const', 'keen')]
+            ),
+        'protocolsDifferentAgentType': dict(
+            common, aShares=((A//n)-2, (A//n)+2, (A//n)-1), bShares=((B//n)-2, (A//n)+2, (B//n)-1),
+            evaluations=[(protocol, type) for protocol in ['sim', 'seq-const'] for type in ['lazy', 'keen']]
+            ),
+        'varEvidenceDifferentN': dict(
+            common, aShares=experiments.gapShares(A, n, (1, 1, 0)), bShares=experiments.gapShares(B, n, (3, 5, 1), A), evaluations=[('sim', 'keen')]
+            ),
+        'varEvidenceConstantN': dict(
+            common, aShares=experiments.gapShares(A, n, gap[a]), bShares=experiments.gapShares(B, n, gap[b], A), evaluations=lazy
+            ),
+        'varRoundsToTermination': dict(
+            common, aShares=experiments.gapShares(A, n, gap[a]), bShares=experiments.gapShares(B, n, gap[b], A), evaluations=lazy,
+            target='average rounds'
+            ),
+    }
+
+def sweepBenchmarks(size):
+    for sweep, cell in sweepCells(SWEEP_TRIALS[size]).items():
+        def setup():
+            experiments.OUTCOMES = classes.OutcomeCache() # outcomes of earlier runs would be looked up, not computed
+        run = lambda _, cell=cell: experiments.simulateAll(**cell, seed=0)
+        yield 'sweep cell', dict(sweep=sweep, trials=SWEEP_TRIALS[size]), setup, run
+
+BENCHMARKS = {
+    'deliberation': deliberationBenchmarks,
+    'partition': partitionBenchmarks,
+    'helpers': helperBenchmarks,
+    'sweeps': sweepBenchmarks,
+}
+
+def measure(setup, run, repeat) -> dict:
+    """
+        Times run(setup()) repeat times, then runs it once more under tracemalloc for its peak memory;
+        setup is not measured.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'median seconds': statistics.median(times), 'peak bytes': peak}
+
+def runBenchmarks(groups=None, size='full', repeat=3, progress=True) -> dict:
+    """
+        Runs the benchmarks of groups (keys of BENCHMARKS, all if None), and returns them
+        together with a description of the machine, as written to baseline files.
+    """
+    cases = [case for group in (groups or BENCHMARKS.keys()) for case in BENCHMARKS[group](size)]
+    results = []
+    for k, (name, params, setup, run) in enumerate(cases):
+        results.append({'benchmark': name, 'params': params, **measure(setup, run, repeat)})
+        if progress:
+            parallel.reportProgress(k+1, len(cases), 'benchmarks', unit='cases')
+    return {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'machine': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'size': size,
+        'repeat': repeat,
+        'results': results
+    }
+
+def key(result) -> str:
+    return store.encodeCell({'benchmark': result['benchmark'], **result['params']})
+
+def compare(baseline, current, tolerance=0.25, memoryTolerance=0.1, minSeconds=0.001) -> list:
+    """
+        Compares two sets of results (as returned by runBenchmarks) benchmark by benchmark,
+        and returns the regressions: a list of (key, what, baseline value, current value), where
+        what is 'seconds' or 'peak bytes'. Benchmarks missing from either side are ignored.
+    """
+    before = {key(r):r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        if max(old['seconds'], r['seconds']) >= minSeconds and r['seconds'] > old['seconds']*(1 + tolerance):
+            regressions.append((key(r), 'seconds', old['seconds'], r['seconds']))
+        if r['peak bytes'] > old['peak bytes']*(1 + memoryTolerance):
+            regressions.append((key(r), 'peak bytes', old['peak bytes'], r['peak bytes']))
+    return regressions
+
+def printComparison(baseline, current, regressions) -> None:
+    before = {key(r):r for r in baseline['results']}
+    flagged = {k for k, _, _, _ in regressions}
+    for r in current['results']:
+        old = before.get(key(r))
+        if old is None:
+            print('{k}: new, {s:.4f}s'.format(k = key(r), s = r['seconds']))
+            continue
+        print('{flag} {k}: {old:.4f}s -> {new:.4f}s ({ratio:.2f}x), {oldMem} -> {newMem} bytes'.format(
+            flag = '!!' if key(r) in flagged else '  ', k = key(r), old = old['seconds'], new = r['seconds'],
+            ratio = r['seconds']/old['seconds'] if old['seconds'] > 0 else float('inf'),
+            oldMem = old['peak bytes'], newMem = r['peak bytes']
+            ))
+    print('{k} regression(s)'.format(k = len(regressions)))
+
+def load(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of deliberations, partition algorithms, helpers and sweep cells.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    runParser = commands.add_parser('run', help='run benchmarks, and save them as a baseline')
+    runParser.add_argument('--output', default='benchmarks.json')
+    runParser.add_argument('--groups', nargs='*', choices=list(BENCHMARKS.keys()))
+    runParser.add_argument('--quick', action='store_true', help='smaller profiles and fewer trials')
+    runParser.add_argument('--repeat', type=int, default=3)
+    runParser.add_argument('--baseline', help='compare with these results, and exit with status 1 on regressions')
+    runParser.add_argument('--tolerance', type=float, default=0.25)
+
+    compareParser = commands.add_parser('compare', help='compare saved results with a baseline')
+    compareParser.add_argument('baseline')
+    compareParser.add_argument('current')
+    compareParser.add_argument('--tolerance', type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        current = runBenchmarks(args.groups, 'quick' if args.quick else 'full', args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=1)
+        baseline = load(args.baseline) if args.baseline else None
+    else:
+        current, baseline = load(args.current), load(args.baseline)
+
+    if baseline is not None:
+        regressions = compare(baseline, current, args.tolerance)
+        printComparison(baseline, current, regressions)
+        sys.exit(1 if regressions else 0)
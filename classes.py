@@ -1,33 +1,214 @@
 from typing import Protocol
 import config
 from xmlrpc.client import Boolean
+from collections.abc import Mapping
+from collections import OrderedDict
+import shelve
+import heapq
+import sys
+import time
+import contextlib
+import tracemalloc
 import helpers
+import engines
+
+import numpy as np
+
+class CountRow(Mapping):
+    """
+        Read-only view of a row of a count array, as a dictionary from alternatives to amounts
+        of evidence: the counts of an agent of a profile built with Profile.fromCounts.
+    """
+    __slots__ = ('Matrix', 'row', 'Context')
+
+    def __init__(self, Matrix, row, Context) -> None:
+        self.Matrix, self.row, self.Context = Matrix, row, Context
+
+    def __getitem__(self, x):
+        return int(self.Matrix[self.row, self.Context.index[x]])
+
+    def __iter__(self):
+        return iter(self.Context.Alternatives)
+
+    def __len__(self):
+        return len(self.Context.Alternatives)
+
 class Agent:
-    def __init__(self, id, evidence = dict(), type = 'keen'):
+    __slots__ = ('id', 'type', 'Context', '_counts', '_matrix', '_row', '_evidence', '_cache', '_pool', '_shared', '_nrShared', '_poolVersion')
+
+    def __init__(self, id, evidence = dict(), type = 'keen', Context = None):
         """
             Agent types are keen or lazy.
 
             Indifferent agents are ok with ties, and will not disclose to break a tie. Keen agents will.
+
+            Context (a config.Context) gives the alternatives; config.current() if not given.
         """
         self.id = id # agent id, supposed to be a number
 
+        self.Context = Context or config.current()
+
         self.type = type # type is either 'keen' or 'lazy' 
+
+        self._matrix, self._row = None, None # count array and row, for agents that are views (see view)
         
         if len(evidence) > 0 and all(isinstance(v, int) for v in evidence.values()):
-            self.evidence = helpers.generateEvidenceFromCounts(evidence, self.id) 
-            # if evidence given as numbers, converts it to explicit items
+            self.counts = dict(evidence) 
+            self._evidence = None
+            # if evidence given as numbers, explicit items are only generated when needed
         else:
-            self.evidence = evidence # assumes evidence given explicitly; if not, should rewrite this
+            self.counts = None
+            self._evidence = evidence # assumes evidence given explicitly; if not, should rewrite this
+
+        self._cache = None # preference structure (counts, ranks, top...), valid until evidence changes
+
+        self._pool, self._shared, self._nrShared, self._poolVersion = None, None, 0, None # public evidence shared with others, see joinPool
+
+    @classmethod
+    def view(cls, id, Matrix, row, type = 'keen', Context = None):
+        """
+            Returns an agent whose evidence amounts are row of Matrix, an integer array whose
+            columns follow the alternatives of Context; nothing is copied. Once the agent learns
+            evidence, it holds it itself, and Matrix is left alone.
+        """
+        agent = cls.__new__(cls)
+        agent.id, agent.type, agent.Context = id, type, Context or config.current()
+        agent._counts, agent._matrix, agent._row = None, Matrix, row
+        agent._evidence, agent._cache = None, None
+        agent._pool, agent._shared, agent._nrShared, agent._poolVersion = None, None, 0, None
+        return agent
+
+    @property
+    def counts(self):
+        """
+            Amounts of evidence per alternative if the agent was given evidence as numbers,
+            and has not learned anything since; None otherwise.
+        """
+        if self._pool is not None and self.learnedFromPool():
+            return None
+        if self._matrix is not None:
+            return CountRow(self._matrix, self._row, self.Context)
+        return self._counts
+
+    @counts.setter
+    def counts(self, value):
+        self._counts, self._matrix, self._row = value, None, None
+
+    def countRow(self):
+        """
+            Returns the row of the count array the agent is a view into, or None, also if the
+            agent learned items from its pool since, which the row does not count.
+        """
+        if self._matrix is None or (self._pool is not None and self.learnedFromPool()):
+            return None
+        return self._matrix[self._row]
     
     def __str__(self) -> str:
         return helpers.prettyViewAgent(self.id, helpers.evidenceCounts(self))
 
-    def updateEvidence(self, x, EvidenceItems):
-        # update step
+    @property
+    def evidence(self) -> dict:
+        """
+            Items of evidence for every alternative. For an agent in a pool (see joinPool) this is
+            a new dictionary, joining the items the agent holds with the public ones, and changing
+            it does not change the agent's evidence: use updateEvidence.
+        """
+        if self._pool is not None:
+            return {x:(e | self._pool.items[x] if self._pool.items[x] else e) for x, e in self._evidence.items()}
+        return self.ownEvidence
+
+    @property
+    def ownEvidence(self) -> dict:
+        """
+            Items of evidence the agent holds itself, i.e., leaving out the public items of its pool.
+        """
+        if self._evidence is None:
+            self._evidence = helpers.generateEvidenceFromCounts(self.counts, self.id, self.Context)
+        return self._evidence
+
+    def joinPool(self, Pool) -> None:
+        """
+            From now on the agent's evidence is the evidence it holds together with the public
+            items of Pool (an EvidencePool), which it reads rather than copies, so that items 
+            added to the pool are learned by every agent in it at once. 
+            
+            Joining a new pool keeps what was learned from the previous one.
+        """
+        counts = self.counts
+        self._evidence = self.evidence # with the public items of the previous pool, if any
+        if counts is None: # amounts given as numbers no longer describe the evidence
+            self.counts = None
+        if self._pool is not None or any(Pool.items.values()):
+            self._cache = None
+        self._pool, self._poolVersion = Pool, Pool.version
+        self._shared = {x:len(e & Pool.items[x]) for x, e in self._evidence.items()} # own items that are public
+        self._nrShared = sum(self._shared.values())
+
+    def learnedFromPool(self) -> Boolean:
+        """
+            Returns True if the pool holds items the agent did not hold itself.
+        """
+        return self._pool.size > self._nrShared # the agent's public items are a subset of the pool's
+
+    def amount(self, x) -> int:
+        """
+            Returns the number of items of evidence the agent has for x.
+        """
+        if self._pool is not None:
+            return len(self._evidence[x]) + len(self._pool.items[x]) - self._shared[x]
+        return len(self.ownEvidence[x])
+
+    def cached(self, Key, Compute):
+        """
+            Returns the value stored under Key in the agent's cache, computing it with Compute()
+            if the agent's evidence has changed since it was stored. 
+            
+            Cached values are shared between callers, and should not be modified.
+        """
+        if self._pool is not None and self._poolVersion != self._pool.version: # public evidence was added
+            self._cache, self._poolVersion = None, self._pool.version
+        if self._cache is None:
+            self._cache = dict()
+        if Key not in self._cache:
+            self._cache[Key] = Compute()
+        return self._cache[Key]
+
+    def updateEvidence(self, x, EvidenceItems) -> Boolean:
+        """
+            Adds EvidenceItems (an item, or a collection of items) to the agent's evidence for x.
+            Returns True if the agent's evidence changed, i.e., if some of the items were new.
+        """
+        if self._pool is not None:
+            new = ({EvidenceItems} if isinstance(EvidenceItems, tuple) else set(EvidenceItems)) - self._evidence[x] - self._pool.items[x]
+            if not new:
+                return False
+            self._evidence[x] = self._evidence[x] | new # a new set: snapshots may hold the old one
+            self._pool.register(self, x, new)
+            self.counts = None
+            self._cache = None
+            return True
+
         if isinstance(EvidenceItems, tuple):
-            self.evidence[x] = self.evidence[x] | {EvidenceItems}
+            updated = self.evidence[x] | {EvidenceItems}
         else:
-            self.evidence[x] = self.evidence[x] | set(EvidenceItems)
+            updated = self.evidence[x] | set(EvidenceItems)
+
+        if len(updated) > len(self.evidence[x]): # only an actual change invalidates the cache
+            self.evidence[x] = updated
+            self.counts = None # counts no longer describe the evidence
+            cache = self._cache or dict()
+            counts, vector = cache.get('counts'), cache.get('vector')
+            self._cache = dict()
+            # only the amount for x changed: patch copies of the amounts rather than recount every alternative
+            if counts is not None:
+                self._cache['counts'] = {**counts, x:len(updated)}
+            if vector is not None:
+                vector = vector.copy()
+                vector[self.Context.index[x]] = len(updated)
+                vector.flags.writeable = False
+                self._cache['vector'] = vector
+            return True
+        return False
 
     def preferredTo(self, Outcome) -> set:
         """
@@ -45,19 +226,26 @@ class Agent:
 
             If agent type is lazy the function returns alternatives, if any, that are 
         """
+        return set(self.cached(('preferred to', frozenset(Outcome)), lambda: self._preferredTo(Outcome)))
+
+    def _preferredTo(self, Outcome) -> frozenset:
+        # ranks are dense and lower rank means more evidence, so x is ranked above y
+        # exactly when x has strictly more evidence than y, and preferences can be read off the counts
         if self.type == 'keen':
-            if helpers.top(self) == Outcome:
-                return set()
-            if Outcome < helpers.top(self):
-                return helpers.top(self) - Outcome 
-            else:
-                return {
-                    x for x in config.Alternatives if any(helpers.ranks(self)[x] < helpers.ranks(self)[y] for y in Outcome)
-                    }
+            top = helpers.cachedTop(self)
+            if top == Outcome:
+                return frozenset()
+            if Outcome < top:
+                return frozenset(top - Outcome)
+            # x is ranked above some alternative in Outcome iff it is ranked above the worst one 
+            threshold = min(helpers.cachedCounts(self)[y] for y in Outcome)
 
         if self.type == 'lazy':
-            minOutcomeRank = min([helpers.ranks(self)[y] for y in Outcome]) if Outcome != set() else 0
-            return {x for x in config.Alternatives if helpers.ranks(self)[x] < minOutcomeRank}
+            if Outcome == set():
+                return frozenset()
+            threshold = max(helpers.cachedCounts(self)[y] for y in Outcome)
+
+        return frozenset(x for x, c in helpers.cachedCounts(self).items() if c > threshold)
 
     def unhappyWith(self, Outcome) -> Boolean:
         """
@@ -77,12 +265,51 @@ class Agent:
 
 
 class Profile:
-    def __init__(self, input) -> None:
+    def __init__(self, input, Context = None) -> None:
         self.agentList = input # input assumed to be list of instances of Agent class
-        self.agentIds = [Agent.id for Agent in self.agentList]       
+        self.Context = Context or (self.agentList[0].Context if self.agentList else config.current()) # agents are assumed to share it
+        self.matrix = None # count array the agents are views into, see fromCounts
+        self._agentsById, self._positions = None, None # built when first needed
+
+    @classmethod
+    def fromCounts(cls, Counts, Types = 'keen', Context = None, ids = None):
+        """
+            Returns a profile whose agents are views (see Agent.view) into Counts, an integer array
+            of shape (n, m) whose columns follow the alternatives of Context: the amounts of evidence
+            are kept in a single array, and each agent only takes a small constant amount of memory.
+
+            Types is an agent type, or a list with the type of every agent. Agents have ids 1, ..., n,
+            unless given.
+        """
+        Context = Context or config.current()
+        Counts = np.ascontiguousarray(Counts, dtype=np.int64)
+        types = [Types]*len(Counts) if isinstance(Types, str) else Types
+        ids = range(1, len(Counts)+1) if ids is None else ids
+        profile = cls([Agent.view(id, Counts, k, t, Context) for k, (id, t) in enumerate(zip(ids, types))], Context)
+        profile.matrix = Counts
+        return profile
+
+    @property
+    def agentsById(self) -> dict:
+        if self._agentsById is None:
+            self._agentsById = {Agent.id:Agent for Agent in reversed(self.agentList)} # first agent wins if ids repeat
+        return self._agentsById
+
+    @property
+    def positions(self) -> dict:
+        if self._positions is None:
+            self._positions = {Agent.id:k for k, Agent in reversed(list(enumerate(self.agentList)))} # id -> index in agentList
+        return self._positions
+
+    @property
+    def agentIds(self):
+        return self.agentsById.keys() # ordered, with constant-time membership checks
 
     def __getitem__(self, agentID):
-        return next(i for i in self.agentList if i.id == agentID)
+        return self.agentsById[agentID]
+
+    def __contains__(self, agentID):
+        return agentID in self.agentsById
     
     def __iter__(self):
         return iter(self.agentList)
@@ -90,6 +317,23 @@ class Profile:
     def __len__(self):
         return len(self.agentList)
 
+    def countMatrix(self):
+        """
+            Returns an integer array of shape (n, m) with the amounts of evidence of all agents:
+            rows follow agentList, columns follow the alternatives of Context.
+        """
+        if self.matrix is not None and all(i._matrix is self.matrix and i.countRow() is not None for i in self.agentList): # no agent learned anything
+            return self.matrix.copy()
+        return np.array(
+            [helpers.countVector(i) for i in self.agentList], dtype=np.int64
+            ).reshape(len(self.agentList), len(self.Context.Alternatives))
+
+    def keenMask(self):
+        """
+            Returns a boolean array of shape (n,) marking the keen agents, in the order of agentList.
+        """
+        return np.array([i.type == 'keen' for i in self.agentList], dtype=bool)
+
     # def __str__(self) -> str:
     #     s = ''
     #     for i in self.agentList:
@@ -105,97 +349,537 @@ class Profile:
 
 
 
+class PluralityTracker:
+    """
+        Keeps the plurality scores of a profile up to date as agents learn evidence.
+
+        Agents whose evidence changed are reported with changed(); their top alternatives
+        are recomputed, and the scores adjusted, the next time winners are asked for.
+        Winners are then found in time linear in the number of alternatives.
+
+        If the agents share Pool (an EvidencePool), items added to it change every agent's 
+        evidence, and need not be reported: for every alternative x that got new public items,
+        only the agents that now have as much evidence for x as for their top alternatives can
+        have new top alternatives, and only their top alternatives are recomputed, at the cost 
+        of a lookup for every agent.
+    """
+    def __init__(self, Profile, Pool=None) -> None:
+        self.tops = {i:helpers.cachedTop(i) for i in Profile}
+        self.best = {i:helpers.cachedCounts(i)[next(iter(top))] for i, top in self.tops.items()} # amount for the top alternatives
+        self.alternatives = Profile.Context.Alternatives
+        self.scores = {x:0 for x in self.alternatives}
+        for top in self.tops.values():
+            for x in top:
+                self.scores[x] += 1
+        self.stale = set() # agents whose top alternatives may have changed
+        self.currentWinners = None
+        self.pool = Pool
+        self.poolVersion = Pool.version if Pool is not None else None
+        self.poolSizes = {x:len(e) for x, e in Pool.items.items()} if Pool is not None else None
+
+    def changed(self, Agent) -> None:
+        self.stale.add(Agent)
+
+    def poolChanged(self) -> None:
+        """
+            Marks stale the agents whose top alternatives items added to the pool can have changed.
+        """
+        grown = [x for x, e in self.pool.items.items() if len(e) != self.poolSizes[x]]
+        for x in grown:
+            self.poolSizes[x] = len(self.pool.items[x])
+        for i, best in self.best.items():
+            if any(i.amount(x) >= best for x in grown):
+                self.stale.add(i)
+        self.poolVersion = self.pool.version
+
+    def winners(self) -> set:
+        if self.pool is not None and self.poolVersion != self.pool.version:
+            self.poolChanged()
+        for i in self.stale:
+            top = helpers.cachedTop(i)
+            self.best[i] = helpers.cachedCounts(i)[next(iter(top))]
+            if top != self.tops[i]:
+                for x in self.tops[i] - top:
+                    self.scores[x] -= 1
+                for x in top - self.tops[i]:
+                    self.scores[x] += 1
+                self.tops[i] = top
+                self.currentWinners = None
+        self.stale.clear()
+
+        if self.currentWinners is None:
+            maxScore = max(self.scores.values())
+            self.currentWinners = {x for x in self.alternatives if self.scores[x] == maxScore}
+        return set(self.currentWinners)
+
+class EvidencePool:
+    """
+        Public items of evidence for every alternative, shared by the agents that joined the pool
+        (see Agent.joinPool): an item that gets published is added here once, rather than to the 
+        evidence of every agent, and an agent's evidence is what it holds together with the pool.
+
+        The version changes whenever items are added, which tells agents that their cached 
+        preferences are out of date. Every agent keeps track of how many of its own items are
+        public, so that its amounts of evidence are known without joining sets: the items held by
+        more than one agent are indexed in holders, which is empty for profiles built from counts.
+    """
+    def __init__(self, Context) -> None:
+        self.items = {x:set() for x in Context.Alternatives}
+        self.size = 0 # number of public items, over all alternatives
+        self.version = 0
+        self.holders = dict() # (x, item) -> agents holding item, for items held by more than one agent
+
+    def join(self, Agents) -> None:
+        firstHolder = dict()
+        for i in Agents:
+            i.joinPool(self)
+            for x, items in i.ownEvidence.items():
+                for e in items:
+                    if (x, e) in firstHolder:
+                        self.holders.setdefault((x, e), [firstHolder[(x, e)]]).append(i)
+                    else:
+                        firstHolder[(x, e)] = i
+
+    def register(self, Agent, x, Items) -> None:
+        """
+            Records that Agent learned Items, not yet public, for x outside the pool.
+        """
+        for e in Items:
+            self.holders.setdefault((x, e), []).append(Agent)
+
+    def publish(self, Discloser, x, Items) -> set:
+        """
+            Adds Items, disclosed by Discloser, to the public items for x, and returns those that were new.
+        """
+        new = Items - self.items[x]
+        if new:
+            self.items[x] |= new
+            self.size += len(new)
+            self.version += 1
+            shared = sum(1 for e in new if e in Discloser._evidence[x])
+            Discloser._shared[x] += shared
+            Discloser._nrShared += shared
+            for e in new:
+                for i in self.holders.get((x, e), ()):
+                    if i is not Discloser:
+                        i._shared[x] += 1
+                        i._nrShared += 1
+        return new
+
+class PrivateEvidence:
+    """
+        Index of the items of evidence that agents hold and that are not public yet.
+
+        For every agent and alternative the private items are kept in a heap, built from the
+        agent's evidence the first time it is needed. Items that became public in the meantime
+        are dropped when they reach the top of the heap, so the canonical next item to disclose
+        (the smallest one) is found in O(log k).
+
+        PublicEvidence is the dictionary of public items for every alternative, which 
+        the index reads as it gets updated.
+    """
+    def __init__(self, PublicEvidence) -> None:
+        self.publicEvidence = PublicEvidence
+        self.heaps = dict()
+
+    def heap(self, Agent, x) -> list:
+        if (Agent, x) not in self.heaps:
+            items = [e for e in Agent.ownEvidence[x] if e not in self.publicEvidence[x]]
+            heapq.heapify(items)
+            self.heaps[(Agent, x)] = items
+
+        items = self.heaps[(Agent, x)]
+        while items and items[0] in self.publicEvidence[x]:
+            heapq.heappop(items)
+        return items
+
+    def hasPrivate(self, Agent, x) -> Boolean:
+        return len(self.heap(Agent, x)) > 0
+
+    def nextItem(self, Agent, x):
+        return self.heap(Agent, x)[0]
+
+    def private(self, Agent, x) -> set:
+        return {e for e in self.heap(Agent, x) if e not in self.publicEvidence[x]}
+
+class HistoryRound(Mapping):
+    """
+        Entry of a History for one round, read like the dictionaries of the original history:
+        'type' (round 0 only), 'winners at round start', 'disclosers', 'nominations', 
+        'profile at round end' and 'winners at round end'.
+
+        The profile at round end is not stored: the History rebuilds it when asked for.
+    """
+    def __init__(self, History, round, fields) -> None:
+        self.History = History
+        self.round = round
+        self.fields = fields
+
+    def hasProfile(self):
+        return self.History.initialProfile is not None
+
+    def __getitem__(self, key):
+        if key == 'profile at round end' and self.hasProfile():
+            return self.History.profileAt(self.round)
+        return self.fields[key]
+
+    def __contains__(self, key):
+        return key in self.fields or (key == 'profile at round end' and self.hasProfile())
+
+    def __iter__(self):
+        for key in self.fields:
+            if key == 'winners at round end' and self.hasProfile():
+                yield 'profile at round end'
+            yield key
+
+    def __len__(self):
+        return len(self.fields) + (1 if self.hasProfile() else 0)
+
+class History(dict):
+    """
+        Dictionary from rounds to HistoryRound entries.
+
+        Profiles are delta-encoded: only the initial profile and the disclosures of every round
+        are kept, and the profile at the end of a round is rebuilt on demand by applying 
+        Advance(profile, disclosers) round after round (see the engines). The last profile 
+        rebuilt is remembered, so going through the rounds in order replays each round once.
+
+        Without an initial profile (summary histories) no profiles are available.
+    """
+    def __init__(self, initialProfile=None, Advance=None) -> None:
+        super().__init__()
+        self.initialProfile = initialProfile
+        self.Advance = Advance
+        self.lastProfile = (0, initialProfile)
+
+    def profileAt(self, round) -> dict:
+        start, profile = self.lastProfile if self.lastProfile[0] <= round else (0, self.initialProfile)
+        for r in range(start+1, round+1):
+            profile = self.Advance(profile, self[r]['disclosers'])
+        self.lastProfile = (round, profile)
+        return profile
+
+class OutcomeCache:
+    """
+        Remembers the outcome (final winners, number of rounds and number of disclosures) 
+        of deliberations, see Deliberation. 
+
+        A deliberation is determined by the protocol, the alternatives, and the types and 
+        evidence counts of the agents, so these make up the key (see key); for protocols 
+        where the order of the agents does not matter, agents are sorted first.
+
+        At most maxSize outcomes are kept in memory, the least recently used being dropped.
+        If spill is the name of a file, dropped outcomes are written there (see shelve),
+        and looked up when they are not in memory. Call close() when done with it.
+    """
+    SYMMETRIC_PROTOCOLS = {'sim'} # protocols whose outcome does not depend on the order of the agents
+
+    def __init__(self, maxSize=100000, spill=None) -> None:
+        self.maxSize = maxSize
+        self.outcomes = OrderedDict()
+        self.spill = shelve.open(spill) if spill is not None else None
+        self.hits, self.misses = 0, 0
+
+    @classmethod
+    def key(cls, Profile, Protocol):
+        """
+            Canonical encoding of a deliberation of Protocol on Profile, or None if it can't be 
+            cached: all agents have to be given evidence as numbers, and must not have learned anything.
+        """
+        counts = [i.counts for i in Profile]
+        if any(c is None for c in counts) or len(Profile.agentIds) != len(Profile):
+            return None
+        alternatives = Profile.Context.Alternatives
+        agents = [(i.type,) + tuple(c.get(x, 0) for x in alternatives) for i, c in zip(Profile, counts)]
+        if Protocol in cls.SYMMETRIC_PROTOCOLS:
+            agents.sort()
+        return (Protocol, tuple(alternatives), tuple(agents))
+
+    def get(self, key):
+        """
+            Returns the outcome stored under key, as a tuple (winners, nrRounds, nrDisclosures), or None.
+        """
+        if key in self.outcomes:
+            self.hits += 1
+            self.outcomes.move_to_end(key)
+            return self.outcomes[key]
+        if self.spill is not None and repr(key) in self.spill:
+            self.hits += 1
+            outcome = self.spill[repr(key)]
+            self.put(key, outcome)
+            return outcome
+        self.misses += 1
+        return None
+
+    def put(self, key, outcome) -> None:
+        self.outcomes[key] = outcome
+        self.outcomes.move_to_end(key)
+        while len(self.outcomes) > self.maxSize:
+            oldKey, oldOutcome = self.outcomes.popitem(last=False)
+            if self.spill is not None:
+                self.spill[repr(oldKey)] = oldOutcome
+
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+class Profiler:
+    """
+        Adds up the time spent in each phase of deliberations, and the number of calls:
+            'disclosure discovery': finding who has something to disclose (engine.disclosable);
+            'item selection': picking the items to disclose (engine.nextItem, engine.private);
+            'evidence broadcast': making items public (engine.publish);
+            'winner recomputation': winners, top alternatives and nominations (engine.winners,
+                engine.top, engine.preferredTo);
+            'history snapshotting': recording rounds, and rebuilding profiles (engine.snapshot, 
+                engine.advance, Deliberation.recordRound);
+            'engine setup': building the engine's state from the profile;
+            'protocol': the rest of the deliberation, e.g., the scoring of nominations, with 
+                one call for every deliberation that is simulated;
+            'outcome cache': looking deliberations up in an OutcomeCache.
+        Other phases, e.g., sampling profiles in experiments, can be added with phase().
+
+        Phases nest, and the time of a phase inside another is only counted for the inner one.
+
+        With memory=True, memory is traced with tracemalloc, which slows everything down, and is left 
+        running. Python keeps no count of the allocations made, only of the memory in use, so every
+        phase gets:
+            'retained blocks' and 'retained bytes': memory blocks and bytes allocated in the phase
+                and not freed by its end, added up over its calls;
+            'peak bytes': the most memory in use at any time in the phase, beyond what was in use 
+                when it started, over all its calls: temporaries that are freed again, e.g., copies 
+                made while selecting items or rebuilding profiles, show up here.
+        As for time, memory used while an inner phase runs is only counted for the inner one.
+
+        A deliberation is only slowed down if it is given a profiler, see Deliberation.
+    """
+    def __init__(self, memory=False) -> None:
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.totals = dict() # phase -> [calls, seconds, retained blocks, retained bytes, peak bytes]
+        self.stack = [] # open phases, as [phase, start time, start blocks, start bytes, time in inner phases, blocks, bytes, peak]
+
+    def start(self, phase) -> None:
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack: # the peak of the outer phase so far, as tracing the inner one starts afresh
+                self.stack[-1][7] = max(self.stack[-1][7], peak)
+            tracemalloc.reset_peak()
+            self.stack.append([phase, time.perf_counter(), sys.getallocatedblocks(), current, 0, 0, 0, current])
+        else:
+            self.stack.append([phase, time.perf_counter(), 0, 0, 0, 0, 0, 0])
+
+    def stop(self) -> None:
+        phase, start, startBlocks, startBytes, innerSeconds, innerBlocks, innerBytes, peak = self.stack.pop()
+        seconds = time.perf_counter() - start
+        if self.memory:
+            blocks = sys.getallocatedblocks() - startBlocks
+            current, innerPeak = tracemalloc.get_traced_memory()
+            peak = max(peak, innerPeak) - startBytes
+            bytes = current - startBytes
+            tracemalloc.reset_peak() # the outer phase goes on from here
+        else:
+            blocks, bytes, peak = 0, 0, 0
+        total = self.totals.setdefault(phase, [0, 0.0, 0, 0, 0])
+        total[0] += 1
+        total[1] += seconds - innerSeconds
+        total[2] += blocks - innerBlocks
+        total[3] += bytes - innerBytes
+        total[4] = max(total[4], peak)
+        if self.stack:
+            self.stack[-1][4] += seconds
+            self.stack[-1][5] += blocks
+            self.stack[-1][6] += bytes
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        self.start(phase)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def export(self) -> dict:
+        """
+            Returns a dictionary from phases to their 'calls' and 'seconds' (and 'retained blocks',
+            'retained bytes' and 'peak bytes', with memory=True), that json can write.
+        """
+        phases = dict()
+        for phase, (calls, seconds, blocks, bytes, peak) in self.totals.items():
+            phases[phase] = {'calls': calls, 'seconds': seconds}
+            if self.memory:
+                phases[phase].update({'retained blocks': blocks, 'retained bytes': bytes, 'peak bytes': peak})
+        return phases
+
 class Deliberation:
-    def __init__(self, Profile, Protocol='sim') -> None:
+    def __init__(self, Profile, Protocol='sim', Engine='sets', HistoryLevel='full', Cache=None, Context=None, Profiler=None, EarlyStop=False) -> None:
+        """
+            Engine is 'sets' or 'counts' (see engines.py). Both give the same final winners
+            and number of rounds on profiles whose agents were given evidence as numbers;
+            'counts' never builds items of evidence, and does not update the agents.
+
+            HistoryLevel says how much of the deliberation is kept in History:
+                'none': nothing, only finalWinners, nrRounds and nrDisclosures are available;
+                'summary': winners, disclosers and nominations for every round;
+                'full': the above, plus the profile at the end of every round, 
+                rebuilt on demand from the initial profile and the disclosures (see History).
+
+            Cache is an OutcomeCache, consulted with HistoryLevel 'none' only: if the outcome is
+            known, nothing is simulated, and State is None.
+
+            Context (a config.Context) gives the alternatives; that of Profile if not given.
+
+            Profiler, a Profiler, adds up the time spent in each phase of the deliberation;
+            without one, nothing is measured, and nothing is slowed down.
+
+            With EarlyStop, the simultaneous protocol checks, every round, whether the evidence
+            still private could change the winners, whatever is disclosed next (see engines.settledMask);
+            if it could not, the deliberation ends there, with the same final winners but fewer rounds, 
+            and stoppedEarly is True. Such runs are not cached.
+        """
         self.Profile = Profile
+        self.Context = Context or Profile.Context
         self.Protocol = Protocol
-        self.History = {
-            0: {
-                'type': self.Protocol,
-                'winners at round start': helpers.pluralityWinners(self.Profile), # winners of profile before update
-                'disclosers': dict(), # dictionary of agents who have something to disclose
-                'nominations': {i:set() for i in self.Profile}, # dict with what alternatives each agent nominates
-                'profile at round end': {i.id:{x:e for x, e in i.evidence.items()} for i in self.Profile},
-                'winners at round end': helpers.pluralityWinners(self.Profile) # winners of profile after profile update
-            }
-        }
+        self.Engine = Engine
+        self.HistoryLevel = HistoryLevel
+        self.Profiler = Profiler
+        self.EarlyStop = EarlyStop
+        self.stoppedEarly = False
+
+        key = OutcomeCache.key(Profile, Protocol) if Cache is not None and HistoryLevel == 'none' and not EarlyStop else None
+        if key is not None:
+            if Profiler is not None:
+                Profiler.start('outcome cache')
+            outcome = Cache.get(key)
+            if outcome is not None:
+                self.State, self.History = None, History()
+                winners, self.nrRounds, self.nrDisclosures = outcome
+                self.finalWinners = set(winners)
+                if Profiler is not None:
+                    Profiler.stop()
+                return
+            if Profiler is not None:
+                Profiler.stop()
+
+        if Profiler is not None:
+            Profiler.start('protocol')
+            Profiler.start('engine setup')
+        self.State = engines.ENGINES[Engine](self.Profile, self.Context)
+        if Profiler is not None:
+            Profiler.stop()
+            self.State = engines.ProfiledEngine(self.State, Profiler)
+        self.History = History(self.State.snapshot(), self.State.advance) if self.HistoryLevel == 'full' else History()
+        self.nrDisclosures = 0 # number of items of evidence disclosed
+
+        if self.HistoryLevel != 'none':
+            self.recordRound(
+                0, 
+                winnersAtRoundStart = self.State.winners(), 
+                disclosers = dict(), 
+                nominations = {i:set() for i in self.Profile}
+                )
 
         if Protocol == 'sim':
             self.finalWinners = self.simultaneous()
         if Protocol == 'seq-const':
             self.finalWinners = self.sequential()
-        
-        self.nrRounds = max(self.History.keys())
+
+        if key is not None:
+            Cache.put(key, (frozenset(self.finalWinners), self.nrRounds, self.nrDisclosures))
+        if Profiler is not None:
+            Profiler.stop()
     
     def __str__(self) -> str:
+        if len(self.History) == 0: # HistoryLevel 'none', or outcome read from Cache
+            return '{type} protocol\n\nWinning: {W}, after {r} rounds and {d} disclosures.\n(no history: HistoryLevel {level}{cached})\n'.format(
+                type = self.Protocol,
+                W = ', '.join(sorted(self.finalWinners)),
+                r = self.nrRounds,
+                d = self.nrDisclosures,
+                level = repr(self.HistoryLevel),
+                cached = ', outcome from cache' if self.State is None else ''
+                )
         return helpers.prettyViewHistory(self.History)
+
+    def recordRound(self, round, winnersAtRoundStart, disclosers, nominations, winnersAtRoundEnd=None):
+        """
+            Adds an entry for round to History, according to HistoryLevel.
+            Winners at round end are those of the current profile, unless given.
+        """
+        if self.HistoryLevel == 'none':
+            return
+        if self.Profiler is not None:
+            with self.Profiler.phase('history snapshotting'):
+                self._recordRound(round, winnersAtRoundStart, disclosers, nominations, winnersAtRoundEnd)
+        else:
+            self._recordRound(round, winnersAtRoundStart, disclosers, nominations, winnersAtRoundEnd)
+
+    def _recordRound(self, round, winnersAtRoundStart, disclosers, nominations, winnersAtRoundEnd):
+        fields = {'type': self.Protocol} if round == 0 else dict()
+        fields['winners at round start'] = winnersAtRoundStart # winners of profile before update
+        fields['disclosers'] = disclosers # dictionary of agents who have something to disclose
+        fields['nominations'] = nominations # dict with what alternatives each agent nominates
+        fields['winners at round end'] = self.State.winners() if winnersAtRoundEnd is None else winnersAtRoundEnd # winners of profile after profile update
+        self.History[round] = HistoryRound(self.History, round, fields)
     
+    def settledOr(self, disclosers) -> dict:
+        """
+            Returns disclosers, or nobody if EarlyStop is set and no disclosure can change the winners anymore.
+        """
+        if self.EarlyStop and disclosers and self.State.settled():
+            self.stoppedEarly = True
+            return dict()
+        return disclosers
+
     def simultaneous(self, disclosure='one'):
         """
             Disclosure can be 'one' or 'all'.
         """
-        publicEvidence = {x:set() for x in config.Alternatives}
-        currentWinners = helpers.pluralityWinners(self.Profile)
+        currentWinners = self.State.winners()
         round = 0
-        iHaveSomethingToShare = helpers.thereIsSomethingToDisclose(self.Profile, currentWinners, publicEvidence)
+        iHaveSomethingToShare = self.settledOr(self.State.disclosable(currentWinners))
         
         while iHaveSomethingToShare:
             round +=1 # increment the deliberation round variable
             roundDisclosers = dict()
-            nominations = {i:{x for x in helpers.top(i)} for i in self.Profile}
+            if self.HistoryLevel != 'none':
+                nominations = {i:self.State.top(i) for i in self.Profile}
 
             # first, everyone who has something to say discloses an item of evidence
-            # disclosed evidence gets added to a dictionary
-            disclosedEvidence = {x:set() for x in config.Alternatives} # evidence disclosed this round
             for i in iHaveSomethingToShare.keys(): # for every agent who has something to say
                 if disclosure == 'one':
-                    chosenAlternative = sorted(list(iHaveSomethingToShare[i].keys()))[0] # pick an alternative
-                    disclosedItem = sorted(list(iHaveSomethingToShare[i][chosenAlternative]))[0] # pick some evidence for that alternative
-                    disclosedEvidence[chosenAlternative].add(disclosedItem)
+                    chosenAlternative = iHaveSomethingToShare[i][0] # pick an alternative
+                    disclosedItem = self.State.nextItem(i, chosenAlternative) # pick some evidence for that alternative
+                    roundDisclosers[i] = {chosenAlternative:{disclosedItem}}
                 
                 if disclosure == 'all':
-                    for x in iHaveSomethingToShare[i].keys():
-                        disclosedEvidence[x] = iHaveSomethingToShare[i][x]
+                    roundDisclosers[i] = {x:self.State.private(i, x) for x in iHaveSomethingToShare[i]}
                 
-                roundDisclosers[i] = disclosedEvidence
+                self.nrDisclosures += sum(len(items) for items in roundDisclosers[i].values())
                     
-            # disclosed evidence gets added to the public evidence 
-            # every agent updates their evidence sets with the evidence disclosed this round
-            for x in disclosedEvidence.keys():
-                publicEvidence[x] = publicEvidence[x] | disclosedEvidence[x]
-
-                for i in self.Profile:
-                    i.updateEvidence(x, disclosedEvidence[x])
+            # disclosed evidence becomes public 
+            # every agent updates their evidence with the evidence disclosed this round
+            self.State.publish(roundDisclosers)
 
             # update the winners with respect to the updated profile, while remembering initial winners (for history)
             winnersAtRoundStart = {x for x in currentWinners}
-            currentWinners = helpers.pluralityWinners(self.Profile)
+            currentWinners = self.State.winners()
 
             # update the history
-            self.History[round] = {
-                'winners at round start': winnersAtRoundStart, # winners of profile before update
-                'disclosers': roundDisclosers, # dictionary of agents who have something to disclose
-                'nominations': nominations,
-                'profile at round end': {i.id:{x:e for x, e in i.evidence.items()} for i in self.Profile},
-                'winners at round end': currentWinners # winners of profile after profile update
-                }
+            self.recordRound(round, winnersAtRoundStart, roundDisclosers, nominations if self.HistoryLevel != 'none' else None, currentWinners)
 
             # lastly, recompute the dictionary of agents who have something to say
-            iHaveSomethingToShare = helpers.thereIsSomethingToDisclose(self.Profile, currentWinners, publicEvidence)
+            iHaveSomethingToShare = self.settledOr(self.State.disclosable(currentWinners))
         
         # update history dictionary with the last step
-        self.History[round+1] = {
-            'winners at round start': helpers.pluralityWinners(self.Profile),
-            'disclosers': dict(), # dictionary of agents who have something to disclose
-            'nominations': dict(),
-            'profile at round end': {i.id:{x:e for x, e in i.evidence.items()} for i in self.Profile},
-            'winners at round end': helpers.pluralityWinners(self.Profile) # winners of profile after profile update
-            }
+        self.nrRounds = round+1
+        self.recordRound(self.nrRounds, self.State.winners(), dict(), dict())
 
-        return self.History[max(self.History.keys())]['winners at round end']
+        return self.State.winners()
 
     def sequential(self):
-        publicEvidence = {x:set() for x in config.Alternatives}
         round = 0
         disclosureHappened = True
         currentWinners = set() # before any nominations there is no winner
@@ -204,51 +888,51 @@ class Deliberation:
             round += 1
             disclosureHappened = False
             winnersAtRoundStart = {x for x in currentWinners} # winners at end of previous round
-            nominations = {i:set() for i in self.Profile}
-            currentNominees = []
+            nominations = {i:set() for i in self.Profile} if self.HistoryLevel != 'none' else None
+            # nominations so far this round, kept as running scores, with the highest score among them
+            currentScores = {x:0 for x in self.Context.Alternatives}
+            maxScore = 0
             roundDisclosers = dict()
             for i in self.Profile: # go through every agent
-                iHaveSomethingToShare = helpers.thereIsSomethingToDisclose(i, currentWinners, publicEvidence)
+                iHaveSomethingToShare = self.State.disclosable(currentWinners, i)
 
                 # first find out if agent is unhappy with current outcome and has unreleased evidence             
                 if iHaveSomethingToShare: # so, if there is something the agent can disclose
                     # pick an alternative, the first one alphabetically
-                    chosenAlternative = sorted(list(iHaveSomethingToShare[i].keys()))[0] 
+                    chosenAlternative = iHaveSomethingToShare[i][0] 
 
                     # pick a non-public item of evidence for that alternative
-                    disclosedItem = sorted(list(iHaveSomethingToShare[i][chosenAlternative]))[0] 
+                    disclosedItem = self.State.nextItem(i, chosenAlternative) 
 
                     # update the dictionary of agents who disclose this round
                     roundDisclosers[i] = {chosenAlternative:{disclosedItem}}
 
-                    # update public evidence for that alternative (the agent has released that evidence)
-                    publicEvidence[chosenAlternative] = publicEvidence[chosenAlternative] | {disclosedItem}
-
-                    # every other agent updates their evidence sets with the released item of evidence
-                    for j in self.Profile:
-                        if j.id != i.id:
-                            j.updateEvidence(chosenAlternative, disclosedItem)
+                    # the item becomes public, and every other agent updates their evidence with it
+                    self.State.publish({i:roundDisclosers[i]})
+                    self.nrDisclosures += 1
                     
                     # update the variable that keeps track of whether disclosure happened 
                     # (if it doesn't at some round we stop)
                     disclosureHappened = True
                 
                 # agent decides who to nominate
-                iNominees = i.preferredTo(currentWinners) if i.preferredTo(currentWinners) else helpers.top(i)
-                nominations[i] = iNominees
-                currentNominees += list(iNominees)
-
-                # update currentWinners variable with the plurality winners over currentNominees
-                currentScores = {x:currentNominees.count(x) for x in config.Alternatives} 
-                currentWinners = {x for x in config.Alternatives if currentScores[x] == max(currentScores.values())}
+                iNominees = self.State.preferredTo(i, currentWinners) or self.State.top(i)
+                if nominations is not None:
+                    nominations[i] = iNominees
+
+                # update currentWinners variable with the plurality winners over the nominations so far:
+                # scores only go up, so only the alternatives just nominated can join or replace the winners
+                for x in iNominees:
+                    currentScores[x] += 1
+                best = max(currentScores[x] for x in iNominees) if iNominees else 0
+                if best > maxScore:
+                    maxScore = best
+                    currentWinners = {x for x in iNominees if currentScores[x] == maxScore}
+                elif best == maxScore:
+                    currentWinners = currentWinners | {x for x in iNominees if currentScores[x] == maxScore}
 
             # update history dictionary
-            self.History[round] = {
-                'winners at round start': winnersAtRoundStart,
-                'disclosers': roundDisclosers, # dictionary of agents who have something to disclose
-                'nominations': nominations,
-                'profile at round end': {i.id:{x:e for x, e in i.evidence.items()} for i in self.Profile},
-                'winners at round end': helpers.pluralityWinners(self.Profile) # winners of profile after profile update
-                }
-
-        return self.History[max(self.History.keys())]['winners at round end']
+            self.recordRound(round, winnersAtRoundStart, roundDisclosers, nominations)
+
+        self.nrRounds = round
+        return self.State.winners()
@@ -11,4 +11,47 @@ COLOR_DICT = {
     8: '#0077b6',
 }
 
-PARTITION_ALGS = dict()
\ No newline at end of file
+class Context:
+    """
+        The setting deliberations take place in: the alternatives, and the partition algorithms
+        used by experiments. Agents, profiles, deliberations and helpers take a Context, so that 
+        deliberations over different alternatives can run side by side, in threads or processes,
+        without touching the module globals above.
+
+        Partition algorithms not given are those of helpers.PARTITION_ALGS and 
+        helpers.BATCH_PARTITION_ALGS.
+    """
+    def __init__(self, Alternatives, PartitionAlgs=None, BatchPartitionAlgs=None) -> None:
+        self.Alternatives = list(Alternatives)
+        self.index = {x:k for k, x in enumerate(self.Alternatives)} # alternative -> integer id
+        self.order = sorted(range(len(self.Alternatives)), key=lambda k: self.Alternatives[k]) # ids, alphabetically
+        self._partitionAlgs = PartitionAlgs
+        self._batchPartitionAlgs = BatchPartitionAlgs
+
+    @property
+    def PARTITION_ALGS(self) -> dict:
+        if self._partitionAlgs is not None:
+            return self._partitionAlgs
+        import helpers # helpers imports config
+        return helpers.PARTITION_ALGS
+
+    @property
+    def BATCH_PARTITION_ALGS(self) -> dict:
+        if self._batchPartitionAlgs is not None:
+            return self._batchPartitionAlgs
+        import helpers
+        return helpers.BATCH_PARTITION_ALGS
+
+    def __repr__(self) -> str:
+        return 'Context({a})'.format(a = self.Alternatives)
+
+_current = None
+
+def current() -> Context:
+    """
+        The context described by the module globals, for callers that don't give one.
+    """
+    global _current
+    if _current is None or _current.Alternatives != Alternatives:
+        _current = Context(Alternatives)
+    return _current
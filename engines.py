@@ -0,0 +1,422 @@
+import config
+import classes
+import helpers
+
+import numpy as np
+
+def topMask(Counts):
+    """
+        Counts is an array of evidence amounts whose last axis runs over alternatives.
+
+        Returns a boolean array of the same shape marking the top alternatives
+        (i.e., those supported by most evidence) of every agent.
+    """
+    return Counts == Counts.max(axis=-1, keepdims=True)
+
+def preferredMask(Counts, Outcome, Keen):
+    """
+        Array version of Agent.preferredTo.
+
+        Counts has shape (..., n, m), Outcome is a boolean mask of shape (..., m)
+        and Keen is a boolean array of shape (n,) marking the keen agents.
+
+        Since ranks are dense and lower rank means more evidence, x is ranked above y
+        exactly when x has strictly more evidence than y. Hence a lazy agent prefers
+        the alternatives that beat every alternative in Outcome, and a keen agent
+        (unless Outcome is its top set, or a strict subset of it) prefers the
+        alternatives that beat some alternative in Outcome.
+    """
+    Outcome = Outcome[..., None, :]
+    nonEmpty = Outcome.any(axis=-1, keepdims=True)
+    outcomeMax = np.where(Outcome, Counts, -1).max(axis=-1, keepdims=True)
+    outcomeMin = np.where(Outcome, Counts, np.iinfo(Counts.dtype).max).min(axis=-1, keepdims=True)
+
+    lazy = (Counts > outcomeMax) & nonEmpty
+
+    top = topMask(Counts)
+    topIsOutcome = (top == Outcome).all(axis=-1, keepdims=True)
+    outcomeBelowTop = (top | ~Outcome).all(axis=-1, keepdims=True) & ~topIsOutcome
+    keen = np.where(outcomeBelowTop, top & ~Outcome, Counts > outcomeMin) & ~topIsOutcome
+
+    return np.where(Keen[:, None], keen, lazy)
+
+def preferredRow(Counts, Outcome, Keen) -> list:
+    """
+        Version of preferredMask for a single agent, on plain lists, which is faster for
+        the handful of alternatives the protocols usually deal with. Counts is the list of
+        the agent's evidence amounts, Outcome a list of alternative indices and Keen a Boolean.
+
+        Returns the indices of the alternatives the agent prefers to Outcome.
+    """
+    if Keen:
+        best = max(Counts)
+        top = [k for k, c in enumerate(Counts) if c == best]
+        outcome = set(Outcome)
+        if set(top) == outcome:
+            return []
+        if all(Counts[k] == best for k in Outcome):
+            return [k for k in top if k not in outcome]
+        threshold = min(Counts[k] for k in Outcome)
+    else:
+        if not Outcome:
+            return []
+        threshold = max(Counts[k] for k in Outcome)
+    return [k for k, c in enumerate(Counts) if c > threshold]
+
+def pluralityMask(Counts):
+    """
+        Array version of helpers.pluralityWinners: Counts has shape (..., n, m),
+        the result marks the plurality winners and has shape (..., m).
+    """
+    scores = topMask(Counts).sum(axis=-2)
+    return scores == scores.max(axis=-1, keepdims=True)
+
+def settledMask(PrivateCounts, PublicCounts, Keen):
+    """
+        PrivateCounts has shape (..., n, m), the evidence each agent still holds privately,
+        PublicCounts has shape (..., m), the evidence that is public, and Keen is a boolean 
+        array of shape (n,) marking the keen agents.
+
+        Marks, with shape (...), the simultaneous deliberations whose plurality winners no 
+        disclosure still to come can change. 
+        
+        Suppose the current winners stay: an agent's amounts never go down, and only go up by 
+        what the others disclose, and an agent only discloses items for an alternative if it 
+        might come to prefer it to the winners (see preferredMask), which these bounds rule out 
+        for some holders, and so on until no more holders are ruled out. The bounds then give, 
+        for every alternative, the agents that might have it among their top alternatives, and 
+        those that surely will. If every winner surely keeps more supporters than any other 
+        alternative might get, and, if there are several, they all keep the supporters they have,
+        the winners can never change: at the first round they did, the bounds would still hold.
+    """
+    counts = PrivateCounts + PublicCounts[..., None, :]
+    m = counts.shape[-1]
+    winners = pluralityMask(counts)
+    top = topMask(counts)
+    outcomeMax = np.where(winners[..., None, :], counts, -1).max(axis=-1, keepdims=True)
+    outcomeMin = np.where(winners[..., None, :], counts, np.iinfo(counts.dtype).max).min(axis=-1, keepdims=True)
+    threshold = np.where(Keen[:, None], outcomeMin, outcomeMax + 1) # amount at which an agent might prefer an alternative
+
+    holders = PrivateCounts > 0 # agents that might still disclose items for an alternative
+    while True:
+        disclosable = np.where(holders, PrivateCounts, 0)
+        reach = counts + disclosable.sum(axis=-2, keepdims=True) - disclosable # the most an agent might learn
+        stillHolders = holders & (reach >= threshold)
+        if (stillHolders == holders).all():
+            break
+        holders = stillHolders
+
+    otherReach = np.where(np.eye(m, dtype=bool), -1, reach[..., None, :]).max(axis=-1) # best any other alternative might do
+    upper = (reach >= counts.max(axis=-1, keepdims=True)).sum(axis=-2) # agents that might have x among their top
+    lower = (top & (otherReach <= counts)).sum(axis=-2) # agents that surely keep x among their top
+    surelyAhead = np.where(winners, lower, np.iinfo(lower.dtype).max).min(axis=-1) > np.where(winners, -1, upper).max(axis=-1)
+    tiesHold = (winners.sum(axis=-1) == 1) | (~winners | (lower == upper)).all(axis=-1)
+    return surelyAhead & tiesHold
+
+def simultaneousBatch(Counts, Types='lazy', Context=None, earlyStop=False):
+    """
+        Runs the simultaneous protocol (one item disclosed per agent and round) on many
+        profiles at once.
+
+        Counts is an integer array of shape (trials, n, m): Counts[t, i, x] is the amount of
+        evidence agent i has for the x-th alternative of Context (config.current() if not given)
+        in trial t. Types is 'keen', 'lazy', or a list with the type of each of the n agents.
+
+        Returns a boolean array of shape (trials, m) marking the final winners of every trial,
+        integer arrays of shape (trials,) with the number of rounds, counted as in
+        Deliberation.nrRounds, and the number of items disclosed, and a boolean array of
+        shape (trials,) marking the trials that stopped early.
+
+        With earlyStop, a trial stops as soon as its winners can no longer change (see settledMask),
+        although some agents still have something to disclose; final winners are the same.
+        The check costs about as much as a round, so it only pays off on profiles where it fires,
+        e.g., those in which a few agents hold much evidence that cannot win the others over.
+    """
+    Counts = np.asarray(Counts, dtype=np.int64)
+    trials, n, m = Counts.shape
+    keen = np.array([t == 'keen' for t in ([Types]*n if isinstance(Types, str) else Types)], dtype=bool)
+    order = np.array((Context or config.current()).order, dtype=np.int64) # alternatives alphabetically
+
+    privateCounts = Counts.copy()
+    publicCounts = np.zeros((trials, m), dtype=np.int64)
+    rounds = np.ones(trials, dtype=np.int64)
+    stoppedEarly = np.zeros(trials, dtype=bool)
+    active = np.arange(trials) # trials where someone might still disclose
+
+    while active.size > 0:
+        counts = privateCounts[active] + publicCounts[active, None, :]
+        
+        # agents who have something to disclose, with respect to the current winners
+        mask = preferredMask(counts, pluralityMask(counts), keen) & (privateCounts[active] > 0)
+        disclosers = mask.any(axis=-1)
+        ongoing = disclosers.any(axis=-1)
+        if earlyStop:
+            settled = ongoing & settledMask(privateCounts[active], publicCounts[active], keen)
+            stoppedEarly[active[settled]] = True
+            ongoing &= ~settled
+        active, mask, disclosers = active[ongoing], mask[ongoing], disclosers[ongoing]
+
+        # every discloser picks the first alternative alphabetically, and discloses an item for it 
+        chosenAlternatives = order[np.argmax(mask[..., order], axis=-1)]
+        t, i = np.nonzero(disclosers)
+        x = chosenAlternatives[t, i]
+        privateCounts[active[t], i, x] -= 1
+        np.add.at(publicCounts, (active[t], x), 1)
+        rounds[active] += 1
+
+    return pluralityMask(privateCounts + publicCounts[:, None, :]), rounds, publicCounts.sum(axis=1), stoppedEarly
+
+class SetEngine:
+    """
+        Keeps the state of a deliberation as explicit items of evidence: every agent holds
+        a set of items for every alternative, and disclosed items go to a pool of public items
+        that all agents share (see classes.EvidencePool), so that a disclosure takes the same 
+        time however many agents learn from it.
+    """
+    def __init__(self, Profile, Context=None) -> None:
+        self.Profile = Profile
+        self.Context = Context or Profile.Context
+        self.pool = classes.EvidencePool(self.Context)
+        self.pool.join(self.Profile)
+        self.publicEvidence = self.pool.items
+        self.privateEvidence = classes.PrivateEvidence(self.publicEvidence)
+        self.tracker = classes.PluralityTracker(self.Profile, self.pool)
+
+    def winners(self) -> set:
+        return self.tracker.winners()
+
+    def top(self, Agent) -> set:
+        return helpers.top(Agent)
+
+    def preferredTo(self, Agent, Outcome) -> set:
+        return Agent.preferredTo(Outcome)
+
+    def disclosable(self, Outcome, Agent=None) -> dict:
+        """
+            Returns dictionary where keys are agents (all agents in the profile, or just Agent)
+            that have something to disclose, and values are the sorted list of alternatives
+            they could disclose evidence for (see helpers.thereIsSomethingToDisclose).
+        """
+        if Outcome == set():
+            return dict()
+
+        disclosers = dict()
+        for i in (self.Profile if Agent is None else [Agent]):
+            alternatives = [x for x in i.preferredTo(Outcome) if self.privateEvidence.hasPrivate(i, x)]
+            if alternatives:
+                disclosers[i] = sorted(alternatives)
+        return disclosers
+
+    def private(self, Agent, x) -> set:
+        """
+            Returns the items of evidence for x that Agent has and that are not yet public.
+        """
+        return self.privateEvidence.private(Agent, x)
+
+    def nextItem(self, Agent, x):
+        """
+            Returns the item Agent discloses next for x: the first of its private items.
+        """
+        return self.privateEvidence.nextItem(Agent, x)
+
+    def publish(self, Disclosures) -> None:
+        """
+            Disclosures is a dictionary of the form {agent: {x: items}}. The items become
+            public, and every agent learns them through the pool.
+        """
+        for i, d in Disclosures.items():
+            for x, items in d.items():
+                self.pool.publish(i, x, set(items))
+
+    def settled(self) -> bool:
+        """
+            Returns True if no disclosure still to come can change the winners, see settledMask.
+        """
+        alternatives = self.Context.Alternatives
+        public = np.array([len(self.publicEvidence[x]) for x in alternatives], dtype=np.int64)
+        counts = np.array([[i.amount(x) for x in alternatives] for i in self.Profile], dtype=np.int64).reshape(len(self.Profile), len(public))
+        return bool(settledMask(counts - public[None, :], public, self.Profile.keenMask())) # an agent's private amount is what it has besides the public items
+
+    def snapshot(self) -> dict:
+        return {i.id:{x:e for x, e in i.evidence.items()} for i in self.Profile}
+
+    @staticmethod
+    def advance(Snapshot, Disclosures) -> dict:
+        """
+            Returns the snapshot that follows Snapshot once Disclosures (as in publish) are made.
+        """
+        disclosedEvidence = dict()
+        for d in Disclosures.values():
+            for x, items in d.items():
+                disclosedEvidence[x] = disclosedEvidence.get(x, set()) | items
+        return {
+            id:{x:(e | disclosedEvidence[x] if x in disclosedEvidence else e) for x, e in evidence.items()} for id, evidence in Snapshot.items()
+            }
+
+class CountEngine:
+    """
+        Keeps the state of a deliberation as integer arrays, indexed by agent and alternative:
+        how much evidence each agent still holds privately, how much evidence is public and
+        how much of the public evidence each agent has learned from others.
+
+        Items of evidence are never built: an agent with k items for x is assumed to hold
+        the items (id, 1), ..., (id, k), as produced by helpers.generateEvidenceFromCounts,
+        and to disclose them in that order. The outcome is the same as for SetEngine on such
+        profiles, since only the counts and what is still private affect the protocols.
+        Agents in the profile are not updated.
+    """
+    def __init__(self, Profile, Context=None) -> None:
+        self.Profile = Profile
+        self.Context = Context or Profile.Context
+        self.agents = list(Profile)
+        self.position = {i:k for k, i in enumerate(self.agents)}
+        self.alternatives = self.Context.Alternatives
+        self.index = self.Context.index
+        self.order = np.array(self.Context.order, dtype=np.int64)
+
+        self.initial = Profile.countMatrix()
+        self.privateCounts = self.initial.copy()
+        self.publicCounts = np.zeros(len(self.alternatives), dtype=np.int64)
+        self.keen = Profile.keenMask()
+        self.currentWinners = None # plurality winners, until the next disclosure
+
+    @property
+    def learnedCounts(self):
+        """
+            Evidence each agent has learned from disclosures by others.
+        """
+        return self.publicCounts[None, :] - (self.initial - self.privateCounts)
+
+    def counts(self):
+        return self.privateCounts + self.publicCounts[None, :]
+
+    def alternativesIn(self, Mask) -> set:
+        return {self.alternatives[k] for k in np.flatnonzero(Mask)}
+
+    def outcomeMask(self, Outcome):
+        mask = np.zeros(len(self.alternatives), dtype=bool)
+        for x in Outcome:
+            mask[self.index[x]] = True
+        return mask
+
+    def winners(self) -> set:
+        if self.currentWinners is None:
+            self.currentWinners = self.alternativesIn(pluralityMask(self.counts()))
+        return set(self.currentWinners)
+
+    def row(self, Agent) -> list:
+        """
+            Returns Agent's evidence amounts, as a list indexed by alternative.
+        """
+        k = self.position[Agent]
+        return (self.privateCounts[k] + self.publicCounts).tolist()
+
+    def top(self, Agent) -> set:
+        counts = self.row(Agent)
+        best = max(counts)
+        return {x for x, c in zip(self.alternatives, counts) if c == best}
+
+    def preferredTo(self, Agent, Outcome) -> set:
+        return {
+            self.alternatives[k] for k in preferredRow(self.row(Agent), [self.index[x] for x in Outcome], self.keen[self.position[Agent]])
+            }
+
+    def disclosable(self, Outcome, Agent=None) -> dict:
+        """
+            Same as SetEngine.disclosable.
+        """
+        if Outcome == set():
+            return dict()
+
+        if Agent is not None:
+            private = self.privateCounts[self.position[Agent]]
+            alternatives = [
+                self.alternatives[k] for k in preferredRow(self.row(Agent), [self.index[x] for x in Outcome], self.keen[self.position[Agent]]) if private[k] > 0
+                ]
+            return {Agent: sorted(alternatives)} if alternatives else dict()
+
+        mask = preferredMask(self.counts(), self.outcomeMask(Outcome), self.keen) & (self.privateCounts > 0)
+        return {
+            self.agents[k]: [self.alternatives[x] for x in self.order if mask[k, x]] for k in np.flatnonzero(mask.any(axis=1))
+            }
+
+    def private(self, Agent, x) -> set:
+        k, j = self.position[Agent], self.index[x]
+        disclosed = int(self.initial[k, j] - self.privateCounts[k, j])
+        return {(Agent.id, e) for e in range(disclosed + 1, int(self.initial[k, j]) + 1)}
+
+    def nextItem(self, Agent, x):
+        k, j = self.position[Agent], self.index[x]
+        return (Agent.id, int(self.initial[k, j] - self.privateCounts[k, j]) + 1)
+
+    def publish(self, Disclosures) -> None:
+        for i, d in Disclosures.items():
+            for x, items in d.items():
+                self.privateCounts[self.position[i], self.index[x]] -= len(items)
+                self.publicCounts[self.index[x]] += len(items)
+        self.currentWinners = None
+
+    def settled(self) -> bool:
+        """
+            Same as SetEngine.settled.
+        """
+        return bool(settledMask(self.privateCounts, self.publicCounts, self.keen))
+
+    def snapshot(self) -> dict:
+        counts = self.counts()
+        return {i.id:{x:int(counts[k, j]) for j, x in enumerate(self.alternatives)} for k, i in enumerate(self.agents)}
+
+    @staticmethod
+    def advance(Snapshot, Disclosures) -> dict:
+        """
+            Same as SetEngine.advance, on snapshots of counts: every agent gains 
+            the disclosed items, except the ones it disclosed itself.
+        """
+        disclosedAmounts = dict()
+        for d in Disclosures.values():
+            for x, items in d.items():
+                disclosedAmounts[x] = disclosedAmounts.get(x, 0) + len(items)
+        ownAmounts = {i.id:{x:len(items) for x, items in d.items()} for i, d in Disclosures.items()}
+        return {
+            id:{x:c + disclosedAmounts.get(x, 0) - ownAmounts.get(id, dict()).get(x, 0) for x, c in counts.items()} for id, counts in Snapshot.items()
+            }
+
+class ProfiledEngine:
+    """
+        Wraps an engine, and charges the time of its methods to the phases of a classes.Profiler 
+        (see PHASES); everything else is passed through.
+    """
+    PHASES = {
+        'disclosable': 'disclosure discovery',
+        'settled': 'disclosure discovery',
+        'nextItem': 'item selection',
+        'private': 'item selection',
+        'publish': 'evidence broadcast',
+        'winners': 'winner recomputation',
+        'top': 'winner recomputation',
+        'preferredTo': 'winner recomputation',
+        'snapshot': 'history snapshotting',
+        'advance': 'history snapshotting',
+    }
+
+    def __init__(self, Engine, Profiler) -> None:
+        self.engine = Engine
+        self.profiler = Profiler
+
+    def __getattr__(self, name):
+        method = getattr(self.engine, name)
+        if name not in self.PHASES:
+            return method
+        phase, profiler = self.PHASES[name], self.profiler
+        def profiled(*args, **kwargs):
+            profiler.start(phase)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                profiler.stop()
+        return profiled
+
+ENGINES = {
+    'sets': SetEngine,
+    'counts': CountEngine,
+}
@@ -1,20 +1,254 @@
 from hashlib import algorithms_available
 import config
 import classes
+import engines
 import helpers
+import parallel
+import sweeps
+import store
+import records
 import random
+import itertools
+import contextlib
 import numpy as np
 import matplotlib.pyplot as plt
 
 a, b, c = 'a', 'b', 'c'
-config.Alternatives = [a,b]
+CONTEXT = config.Context([a,b]) # experiments deliberate over a and b
+
+OUTCOMES = classes.OutcomeCache() # outcomes of sequential deliberations, one cache per process
+
+def deliberate(protocol, agentType, aDists, bDists, Context=CONTEXT, Profiler=None, earlyStop=False):
+    """
+        Runs protocol on a batch of profiles: aDists and bDists are integer arrays of shape 
+        (trials, n) holding the amounts of evidence for a and b of each agent, in every profile. 
+        All agents are of type agentType; Context has alternatives a and b.
+
+        Returns a boolean array marking the final winners of every profile (columns follow 
+        Context.Alternatives), arrays with the number of rounds and the number of items
+        disclosed in every deliberation, and a boolean array marking the deliberations that
+        stopped early.
+        The simultaneous protocol runs on all profiles at once, see engines.simultaneousBatch;
+        outcomes of other protocols are looked up in OUTCOMES first.
+
+        Profiler, a classes.Profiler, adds up the time spent in each phase of the deliberations;
+        the batched simultaneous protocol is a single phase, 'batch deliberation'.
+
+        With earlyStop, simultaneous deliberations end as soon as their winners can no longer
+        change (see classes.Deliberation); other protocols ignore it.
+    """
+    if protocol == 'sim':
+        counts = {a:aDists, b:bDists}
+        with (Profiler.phase('batch deliberation') if Profiler is not None else contextlib.nullcontext()):
+            return engines.simultaneousBatch(np.stack([counts[x] for x in Context.Alternatives], axis=-1), agentType, Context, earlyStop)
+
+    winners, rounds, disclosures = [], [], []
+    for aDist, bDist in zip(np.asarray(aDists).tolist(), np.asarray(bDists).tolist()):
+        P = classes.Profile(
+            [classes.Agent(id = j+1, evidence = {a:aDist[j], b:bDist[j]}, type=agentType, Context=Context) for j in range(len(aDist))],
+            Context
+            )
+        D = classes.Deliberation(Profile = P, Protocol = protocol, Engine = 'counts', HistoryLevel = 'none', Cache = OUTCOMES, Profiler = Profiler)
+        winners.append([x in D.finalWinners for x in Context.Alternatives])
+        rounds.append(D.nrRounds)
+        disclosures.append(D.nrDisclosures)
+    return (
+        np.array(winners, dtype=bool).reshape(len(rounds), len(Context.Alternatives)), np.array(rounds), np.array(disclosures),
+        np.zeros(len(rounds), dtype=bool)
+        )
+
+def successMask(winners, Context=CONTEXT):
+    """
+        Marks the deliberations, given as rows of winners (see deliberate), in which a is the only winner.
+    """
+    return (winners == np.array([x == a for x in Context.Alternatives])).all(axis=1)
+
+def successRate(winners, Context=CONTEXT):
+    """
+        Fraction of deliberations, given as rows of winners (see deliberate), in which a is the only winner.
+    """
+    return np.mean(successMask(winners, Context))
+
+def winnerNames(winners, Context=CONTEXT):
+    """
+        The winners of every deliberation, given as rows of winners (see deliberate), as strings such as 'a' or 'a,b'.
+    """
+    codes = winners.astype(np.int64) @ (1 << np.arange(len(Context.Alternatives)))
+    names = np.array([','.join(x for k, x in enumerate(Context.Alternatives) if c >> k & 1) for c in range(1 << len(Context.Alternatives))])
+    return names[codes]
+
+def simulateAll(n, A, B, aShares, bShares, alg, trials, evaluations, halfWidth=None, target='success rate', batch=500, Context=CONTEXT, profile=False, recordDir=None, earlyStop=False, seed=None):
+    """
+        Draws trials random profiles of n agents, and runs every evaluation, a pair (protocol, agentType),
+        on all of them, so that evaluations are compared on the same profiles. In every profile A items 
+        of evidence for a and B items for b are split among the agents by alg, a batched partition 
+        algorithm (see config.Context.BATCH_PARTITION_ALGS); aShares and bShares are the (minShare, 
+        maxShare, startShare) passed to alg. Deliberations take place in Context, see deliberate.
+
+        If halfWidth is given, profiles are drawn batch at a time, and drawing stops as soon as the 
+        95% confidence intervals for target ('success rate', Wilson interval, or 'average rounds', 
+        normal approximation) of all evaluations are at most halfWidth on either side; trials is then 
+        an upper bound.
+
+        Returns a list with a dictionary for every evaluation, holding the success rate, the rate of 
+        ties, the average and largest number of rounds, the number of trials used, and 'half width', 
+        the half-width of the 95% confidence interval for target reached with these trials. 
+        This is one cell of a sweep, see sweeps.run.
+
+        If profile is True (or 'memory', to also count allocations), the dictionary of every evaluation
+        also holds 'phases': the time spent in every phase of its deliberations (see classes.Profiler),
+        together with 'sampling', the time spent drawing the profiles, which all evaluations share.
+
+        If recordDir is a directory, a record of every trial of every evaluation is added to it 
+        (see records.TrialRecords), with columns 'cell' (the parameters above, see store.encodeCell),
+        'n', 'A', 'B', 'protocol', 'agentType', 'seed' (the seed of the cell, -1 if None), 'trial' 
+        (the index of the profile in the cell: running the cell again with the same seed draws the
+        same profiles), 'winners' (e.g., 'a' or 'a,b'), 'rounds', 'disclosures' and 'stoppedEarly'.
+
+        earlyStop is passed to deliberate; if set, the dictionary of every evaluation also holds
+        'early stop rate', the fraction of deliberations that stopped early, and rounds are counted
+        up to the early stop.
+    """
+    rng = np.random.default_rng(seed)
+    done = 0
+    totals = [{'successes': 0, 'ties': 0, 'rounds': 0, 'roundsSquared': 0, 'maxRounds': 0, 'stoppedEarly': 0} for _ in evaluations]
+    profilers = [classes.Profiler(memory = profile == 'memory') for _ in evaluations] if profile else [None]*len(evaluations)
+    sampling = classes.Profiler(memory = profile == 'memory') if profile else None
+    sink = records.TrialRecords(recordDir) if recordDir is not None else None
+    if sink is not None:
+        cell = store.encodeCell(dict(
+            n=n, A=A, B=B, aShares=aShares, bShares=bShares, alg=alg, trials=trials, evaluations=evaluations,
+            halfWidth=halfWidth, target=target, batch=batch, Context=Context, earlyStop=earlyStop
+            ))
+    while done < trials:
+        size = trials - done if halfWidth is None else min(batch, trials - done)
+        with (sampling.phase('sampling') if sampling is not None else contextlib.nullcontext()):
+            aDists = alg(A, n, *aShares, trials=size, rng=rng)
+            bDists = alg(B, n, *bShares, trials=size, rng=rng)
+        done += size
+        for (protocol, agentType), total, profiler in zip(evaluations, totals, profilers):
+            winners, rounds, disclosures, stoppedEarly = deliberate(protocol, agentType, aDists, bDists, Context, profiler, earlyStop)
+            if sink is not None:
+                sink.write(
+                    cell=cell, n=n, A=A, B=B, protocol=protocol, agentType=agentType, seed=-1 if seed is None else seed,
+                    trial=np.arange(done - size, done), winners=winnerNames(winners, Context), rounds=rounds, disclosures=disclosures,
+                    stoppedEarly=stoppedEarly
+                    )
+            rounds = rounds.astype(np.int64)
+            total['successes'] += int(successMask(winners, Context).sum())
+            total['ties'] += int((winners.sum(axis=1) > 1).sum())
+            total['rounds'] += int(rounds.sum())
+            total['roundsSquared'] += int((rounds**2).sum())
+            total['maxRounds'] = max(total['maxRounds'], int(rounds.max()))
+            total['stoppedEarly'] += int(stoppedEarly.sum())
+
+        if halfWidth is not None:
+            if target == 'success rate' and all(helpers.wilsonHalfWidth(total['successes'], done) <= halfWidth for total in totals):
+                break
+            if target == 'average rounds' and all(helpers.meanHalfWidth(total['rounds'], total['roundsSquared'], done) <= halfWidth for total in totals):
+                break
+    if sink is not None:
+        sink.close()
+
+    results = [
+        {
+            'success rate': total['successes']/done,
+            'tie rate': total['ties']/done,
+            'average rounds': total['rounds']/done,
+            'max rounds': total['maxRounds'],
+            'trials': done,
+            'half width': helpers.wilsonHalfWidth(total['successes'], done) if target == 'success rate' else helpers.meanHalfWidth(total['rounds'], total['roundsSquared'], done)
+        } for total in totals
+        ]
+    if earlyStop:
+        for result, total in zip(results, totals):
+            result['early stop rate'] = total['stoppedEarly']/done
+    if profile:
+        for result, profiler in zip(results, profilers):
+            result['phases'] = {**sampling.export(), **profiler.export()}
+    return results
+
+def simulate(protocol, agentType, n, A, B, aShares, bShares, alg, trials, halfWidth=None, target='success rate', batch=500, Context=CONTEXT, profile=False, recordDir=None, earlyStop=False, seed=None):
+    """
+        Runs protocol on trials random profiles of n agents of type agentType, see simulateAll.
+    """
+    return simulateAll(n, A, B, aShares, bShares, alg, trials, [(protocol, agentType)], halfWidth, target, batch, Context, profile, recordDir, earlyStop, seed)[0]
+
+def exactProfiles(protocol, n, A, B, aVariance=None, bVariance=None):
+    """
+        All pairs (aDist, bDist) of partitions of A and B among n agents (restricted to 
+        aVariance and bVariance, see helpers.hasVariance), with their multiplicities. 
+        For protocols in classes.OutcomeCache.SYMMETRIC_PROTOCOLS profiles that are equal up to permutation of 
+        the agents are produced once, see helpers.pairPartitions.
+    """
+    if protocol in classes.OutcomeCache.SYMMETRIC_PROTOCOLS:
+        for aDist, bDist, weight in helpers.pairPartitions(n, A, B):
+            if helpers.hasVariance(aDist, A, aVariance) and helpers.hasVariance(bDist, B, bVariance):
+                yield aDist, bDist, weight
+        return
+
+    bDists = [p for p in helpers.partitions(n, B) if helpers.hasVariance(p, B, bVariance)]
+    for aDist in helpers.partitions(n, A):
+        if helpers.hasVariance(aDist, A, aVariance):
+            for bDist in bDists:
+                yield aDist, bDist, 1
+
+def exactChunk(protocol, agentType, aDists, bDists, weights, Context=CONTEXT):
+    """
+        Runs protocol on a chunk of profiles (see deliberate), and returns the total weight,
+        the weight of the successful profiles and the weighted sum of rounds, as integers.
+    """
+    winners, rounds, _, _ = deliberate(protocol, agentType, np.array(aDists), np.array(bDists), Context)
+    success = successMask(winners, Context)
+    weights = np.array(weights, dtype=np.int64)
+    return {
+        'weight': int(weights.sum()),
+        'successes': int(weights[success].sum()),
+        'rounds': int((weights*rounds).sum()),
+        'deliberations': len(weights)
+        }
+
+def exactSimulate(protocol, agentType, n, A, B, aVariance=None, bVariance=None, chunkSize=5000, workers=None, progress=True, Context=CONTEXT):
+    """
+        Exact counterpart of simulate for small n, A and B: runs protocol on every way of 
+        splitting A items of evidence for a and B items for b among n agents of type agentType
+        (see exactProfiles), all equally likely, in chunks of chunkSize profiles spread over 
+        workers processes (see parallel.streamCells).
+
+        Returns a dictionary with the success rate, the average number of rounds, the number 
+        of profiles and the number of deliberations actually run.
+    """
+    profiles = exactProfiles(protocol, n, A, B, aVariance, bVariance)
+    def chunks():
+        while True:
+            chunk = list(itertools.islice(profiles, chunkSize))
+            if not chunk:
+                return
+            aDists, bDists, weights = zip(*chunk)
+            yield dict(protocol=protocol, agentType=agentType, aDists=aDists, bDists=bDists, weights=weights, Context=Context)
+
+    total = {'weight': 0, 'successes': 0, 'rounds': 0, 'deliberations': 0}
+    for result in parallel.streamCells(exactChunk, chunks(), workers=workers, progress=progress, label='exactSimulate'):
+        for key in result:
+            total[key] += result[key]
+
+    return {
+        'success rate': total['successes']/total['weight'] if total['weight'] else float('nan'),
+        'average rounds': total['rounds']/total['weight'] if total['weight'] else float('nan'),
+        'profiles': total['weight'],
+        'deliberations': total['deliberations']
+        }
 
 def differentPartitionAlgs(S=100, n=10, minShare=8, maxShare=12, startShare=9, trials=3000):
     for i in [2, 3, 4]:
-        alg = config.PARTITION_ALGS[i]
+        alg = CONTEXT.PARTITION_ALGS[i]
         algName = str(alg).split()[1]
+        if i in CONTEXT.BATCH_PARTITION_ALGS:
+            variances = np.var(CONTEXT.BATCH_PARTITION_ALGS[i](S, n, minShare, maxShare, startShare, trials=trials), axis=1)
+        else:
+            variances = [np.var(alg(S, n, minShare, maxShare, startShare)) for i in range(trials)]
         plt.hist(
-            [np.var(alg(S, n, minShare, maxShare, startShare)) for i in range(trials)], 
+            variances, 
             density=True, 
             bins = 16, 
             color=config.COLOR_DICT[i+4], 
@@ -58,33 +292,34 @@ def samePartitionAlg(
     plt.legend()
     plt.savefig('same-partition-alg.png', dpi=500)
 
-def protocolsDifferentN():
+def gapShares(S, n, gap, upperS=None):
+    """
+        The (minShare, maxShare, startShare) of a partition of S among n agents, for gap = (below, above, 
+        start): shares are at least below under S//n, at most above over upperS//n (upperS is S, 
+        unless given), and start at start under S//n.
+    """
+    upperS = S if upperS is None else upperS
+    return ((S//n)-gap[0], (upperS//n)+gap[1], (S//n)-gap[2])
+
+def protocolsDifferentN(workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     nRange = range(5, 31)
     A, B = 50, 30
     protocols = ['sim', 'seq-const']
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     trials = 200
     fig, ax = plt.subplots()
 
+    evaluations = [(protocol, 'lazy') for protocol in protocols]
+    points = sweeps.grid(n=nRange)
+    cell = lambda p: dict(
+        n=p['n'], A=A, B=B, 
+        aShares=((A//p['n'])-2, (A//p['n'])+2, (A//p['n'])-1), bShares=((B//p['n'])-2, (A//p['n'])+2, (B//p['n'])-1), 
+        alg=alg, trials=trials, evaluations=evaluations, halfWidth=halfWidth, profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='protocolsDifferentN', workers=workers, seed=seed, store=store)
+
     for i in range(len(protocols)):
-        successRates = []
-        for n in nRange:
-            aMin, aMax, aStart = (A//n)-2, (A//n)+2, (A//n)-1
-            bMin, bMax, bStart = (B//n)-2, (A//n)+2, (B//n)-1
-
-            successes = 0
-            for trial in range(trials):
-                aDist = alg(A, n=n, minShare=aMin, maxShare=aMax, startShare=aStart)
-                bDist = alg(B, n=n, minShare=bMin, maxShare=bMax, startShare=bStart)
-                P = classes.Profile(
-                    [
-                        classes.Agent(id = i+1, evidence = {a:aDist[i], b:bDist[i]}, type='lazy') for i in range(n)
-                        ]
-                    )
-                D = classes.Deliberation(Profile = P, Protocol = protocols[i])
-                if D.finalWinners == {a}:
-                    successes += 1
-            successRates.append(successes/trials)
+        successRates = [r[i]['success rate'] for r in results]
         ax.plot(
             nRange, 
             successRates, 
@@ -104,7 +339,7 @@ def protocolsDifferentN():
     ax.legend()
     plt.show()
 
-def evidenceGap():
+def evidenceGap(workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     B = 30
     protocol = 'seq-const'
     aRange = range(B+1, 3*B+1)
@@ -114,26 +349,21 @@ def evidenceGap():
         3:20, 
         4:25
         }
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     trials = 200
     fig, ax = plt.subplots()
+
+    points = sweeps.grid(n=profileSizes.values(), A=aRange)
+    cell = lambda p: dict(
+        n=p['n'], A=p['A'], B=B, 
+        aShares=((p['A']//p['n'])-6, (p['A']//p['n'])+6, (p['A']//p['n'])-1), bShares=((B//p['n'])-2, (B//p['n'])+2, (B//p['n'])-1), 
+        alg=alg, trials=trials, evaluations=[(protocol, 'keen')], halfWidth=halfWidth, profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='evidenceGap', workers=workers, seed=seed, store=store)
+
     for i in profileSizes.keys():
         n = profileSizes[i]
-        mb, Mb, sb = (B//n)-2, (B//n)+2, (B//n)-1
-        successRates = []
-        for A in aRange:
-            ma, Ma, sa = (A//n)-6, (A//n)+6, (A//n)-1
-            successes = 0
-            for trial in range(trials):
-                aDist = alg(A, n=n, minShare=ma, maxShare=Ma, startShare=sa)
-                bDist = alg(B, n=n, minShare=mb, maxShare=Mb, startShare=sb)
-                P = classes.Profile(
-                    [classes.Agent(id = i+1, evidence = {a:aDist[i], b:bDist[i]}) for i in range(n)]
-                    )
-                D = classes.Deliberation(Profile = P, Protocol = protocol)
-                if D.finalWinners == {a}:
-                    successes += 1
-            successRates.append(successes/trials)
+        successRates = [r[0]['success rate'] for r in sweeps.series(points, results, n=n)]
         ax.plot(
             aRange, 
             successRates, 
@@ -153,34 +383,27 @@ def evidenceGap():
     ax.legend()
     plt.show()
 
-def protocolsDifferentAgentType(trials, n, B):
+def protocolsDifferentAgentType(trials, n, B, workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     protocols = ['sim', 'seq-const']
     aRange = range(B+1, 101)
     agentTypes = ['lazy', 'keen']
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     fig, ax = plt.subplots()
+
+    evaluations = [(protocol, type) for protocol in protocols for type in agentTypes]
+    points = sweeps.grid(A=aRange)
+    cell = lambda p: dict(
+        n=n, A=p['A'], B=B, 
+        aShares=((p['A']//n)-2, (p['A']//n)+2, (p['A']//n)-1), bShares=((B//n)-2, (p['A']//n)+2, (B//n)-1), 
+        alg=alg, trials=trials, evaluations=evaluations, halfWidth=halfWidth, profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='protocolsDifferentAgentType', workers=workers, seed=seed, store=store)
+
     colorKey = 0
     for protocol in protocols:
         for type in agentTypes:
             colorKey += 1
-            successRates = []
-            for A in aRange:
-                aMin, aMax, aStart = (A//n)-2, (A//n)+2, (A//n)-1
-                bMin, bMax, bStart = (B//n)-2, (A//n)+2, (B//n)-1
-
-                successes = 0
-                for trial in range(trials):
-                    aDist = alg(A, n=n, minShare=aMin, maxShare=aMax, startShare=aStart)
-                    bDist = alg(B, n=n, minShare=bMin, maxShare=bMax, startShare=bStart)
-                    P = classes.Profile(
-                        [
-                            classes.Agent(id = j+1, evidence = {a:aDist[j], b:bDist[j]}, type=type) for j in range(n)
-                            ]
-                        )
-                    D = classes.Deliberation(Profile = P, Protocol = protocol)
-                    if D.finalWinners == {a}:
-                        successes += 1
-                successRates.append(successes/trials)
+            successRates = [r[evaluations.index((protocol, type))]['success rate'] for r in results]
 
             if type == 'lazy':
                 ax.plot(
@@ -213,11 +436,11 @@ def protocolsDifferentAgentType(trials, n, B):
     ax.legend()
     plt.savefig('plot1.png', dpi=500)
 
-def varEvidenceDifferentN(trials):
+def varEvidenceDifferentN(trials, workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     nRange = range(5, 10)
     A, B = 50, 30
     protocol = 'sim'
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     gaps = {
         1: {
             a:(1, 1, 0),
@@ -229,25 +452,18 @@ def varEvidenceDifferentN(trials):
         }
     }
     fig, ax = plt.subplots()
+
+    points = sweeps.grid(gap=gaps.keys(), n=nRange)
+    cell = lambda p: dict(
+        n=p['n'], A=A, B=B, 
+        aShares=gapShares(A, p['n'], gaps[p['gap']][a]), bShares=gapShares(B, p['n'], gaps[p['gap']][b], A),
+        alg=alg, trials=trials, evaluations=[(protocol, 'keen')], halfWidth=halfWidth, profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='varEvidenceDifferentN', workers=workers, seed=seed, store=store)
+    n = max(nRange) # labels show the shares at the largest n
+
     for i in gaps.keys():
-        successRates = []
-        for n in nRange:
-            aMin, aMax, aStart = (A//n)-gaps[i][a][0], (A//n)+gaps[i][a][1], (A//n)-gaps[i][a][2]
-            bMin, bMax, bStart = (B//n)-gaps[i][b][0], (A//n)+gaps[i][b][1], (B//n)-gaps[i][b][2]
-
-            successes = 0
-            for trial in range(trials):
-                aDist = alg(A, n=n, minShare=aMin, maxShare=aMax, startShare=aStart)
-                bDist = alg(B, n=n, minShare=bMin, maxShare=bMax, startShare=bStart)
-                P = classes.Profile(
-                    [
-                        classes.Agent(id = i+1, evidence = {a:aDist[i], b:bDist[i]}) for i in range(n)
-                        ]
-                    )
-                D = classes.Deliberation(Profile = P, Protocol = protocol)
-                if D.finalWinners == {a}:
-                    successes += 1
-            successRates.append(successes/trials)
+        successRates = [r[0]['success rate'] for r in sweeps.series(points, results, gap=i)]
         ax.plot(
             nRange, 
             successRates, 
@@ -272,10 +488,10 @@ def varEvidenceDifferentN(trials):
     ax.legend()
     plt.savefig('plot2.png', dpi=500)
 
-def varEvidenceConstantN(trials, n, B):
+def varEvidenceConstantN(trials, n, B, workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     aRange = range(B, 101)
     protocols = ['sim', 'seq-const']
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     gaps = {
         1: {
             a:(1, 1, 1),
@@ -287,28 +503,21 @@ def varEvidenceConstantN(trials, n, B):
         }
     }
     fig, ax = plt.subplots()
+
+    evaluations = [(protocol, 'lazy') for protocol in protocols]
+    points = sweeps.grid(gap=gaps.keys(), A=aRange)
+    cell = lambda p: dict(
+        n=n, A=p['A'], B=B, 
+        aShares=gapShares(p['A'], n, gaps[p['gap']][a]), bShares=gapShares(B, n, gaps[p['gap']][b], p['A']),
+        alg=alg, trials=trials, evaluations=evaluations, halfWidth=halfWidth, profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='varEvidenceConstantN', workers=workers, seed=seed, store=store)
+
     colorKey = 0
     for protocol in protocols:
         for i in gaps.keys():
             colorKey += 1
-            successRates = []
-            for A in aRange:
-                aMin, aMax, aStart = (A//n)-gaps[i][a][0], (A//n)+gaps[i][a][1], (A//n)-gaps[i][a][2]
-                bMin, bMax, bStart = (B//n)-gaps[i][b][0], (A//n)+gaps[i][b][1], (B//n)-gaps[i][b][2]
-
-                successes = 0
-                for trial in range(trials):
-                    aDist = alg(A, n=n, minShare=aMin, maxShare=aMax, startShare=aStart)
-                    bDist = alg(B, n=n, minShare=bMin, maxShare=bMax, startShare=bStart)
-                    P = classes.Profile(
-                        [
-                            classes.Agent(id = i+1, evidence = {a:aDist[i], b:bDist[i]}, type='lazy') for i in range(n)
-                            ]
-                        )
-                    D = classes.Deliberation(Profile = P, Protocol = protocol)
-                    if D.finalWinners == {a}:
-                        successes += 1
-                successRates.append(successes/trials)
+            successRates = [r[protocols.index(protocol)]['success rate'] for r in sweeps.series(points, results, gap=i)]
             
             if i == 1:
                 ax.plot(
@@ -354,10 +563,10 @@ def varEvidenceConstantN(trials, n, B):
     ax.legend()
     plt.savefig('plot2.png', dpi=500)
 
-def varRoundsToTermination(trials, n, B):
+def varRoundsToTermination(trials, n, B, workers=None, seed=None, store=None, halfWidth=None, profile=False, recordDir=None, earlyStop=False):
     aRange = range(B, 101)
     protocols = ['sim', 'seq-const']
-    alg = config.PARTITION_ALGS[4]
+    alg = CONTEXT.BATCH_PARTITION_ALGS[4]
     gaps = {
         1: {
             a:(1, 1, 1),
@@ -369,27 +578,21 @@ def varRoundsToTermination(trials, n, B):
         }
     }
     fig, ax = plt.subplots()
+
+    evaluations = [(protocol, 'lazy') for protocol in protocols]
+    points = sweeps.grid(gap=gaps.keys(), A=aRange)
+    cell = lambda p: dict(
+        n=n, A=p['A'], B=B, 
+        aShares=gapShares(p['A'], n, gaps[p['gap']][a]), bShares=gapShares(B, n, gaps[p['gap']][b], p['A']),
+        alg=alg, trials=trials, evaluations=evaluations, halfWidth=halfWidth, target='average rounds', profile=profile, recordDir=recordDir, earlyStop=earlyStop, Context=CONTEXT
+        )
+    results = sweeps.run(simulateAll, points, cell, name='varRoundsToTermination', workers=workers, seed=seed, store=store)
+
     colorKey = 0
     for protocol in protocols:
         for i in gaps.keys():
             colorKey += 1
-            avgNrRounds = []
-            for A in aRange:
-                aMin, aMax, aStart = (A//n)-gaps[i][a][0], (A//n)+gaps[i][a][1], (A//n)-gaps[i][a][2]
-                bMin, bMax, bStart = (B//n)-gaps[i][b][0], (A//n)+gaps[i][b][1], (B//n)-gaps[i][b][2]
-
-                r = []
-                for trial in range(trials):
-                    aDist = alg(A, n=n, minShare=aMin, maxShare=aMax, startShare=aStart)
-                    bDist = alg(B, n=n, minShare=bMin, maxShare=bMax, startShare=bStart)
-                    P = classes.Profile(
-                        [
-                            classes.Agent(id = i+1, evidence = {a:aDist[i], b:bDist[i]}, type='lazy') for i in range(n)
-                            ]
-                        )
-                    D = classes.Deliberation(Profile = P, Protocol = protocol)
-                    r.append(max(D.History.keys()))
-                avgNrRounds.append(sum(r)/trials)
+            avgNrRounds = [r[protocols.index(protocol)]['average rounds'] for r in sweeps.series(points, results, gap=i)]
             
             if i == 1:
                 ax.plot(
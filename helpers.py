@@ -2,11 +2,16 @@ import config
 import classes
 
 import random
+import bisect
+import functools
+import itertools
+import collections
+import math
 import scipy.stats as ss
 import numpy as np
 import matplotlib.pyplot as plt
 
-def generateEvidenceFromCounts(evidence, agentId) -> dict:
+def generateEvidenceFromCounts(evidence, agentId, Context=None) -> dict:
     """
         Returns a dictionary of individual evidence items generated according to the numbers
         in the evidence variable. The individual items are indexed by agentId.
@@ -18,14 +23,48 @@ def generateEvidenceFromCounts(evidence, agentId) -> dict:
             b:{},
             c:{(3,1)}
             }
+
+        Items are generated for the alternatives of Context (config.current() if not given).
     """
-    return {x: {(agentId, i+1) for i in range(evidence[x])} for x in config.Alternatives}
+    Context = Context or config.current()
+    return {x: {(agentId, i+1) for i in range(evidence[x])} for x in Context.Alternatives}
 
 def evidenceCounts(Agent) -> dict:
     """
         Returns a dictionary of the evidence amounts for each alternative, for Agent.
     """
-    return {x:len(Agent.evidence[x]) for x in config.Alternatives}
+    return dict(cachedCounts(Agent))
+
+def cachedCounts(Agent) -> dict:
+    """
+        Version of evidenceCounts that returns the dictionary cached by the agent until its 
+        evidence changes, which must not be modified.
+    """
+    def compute():
+        counts = Agent.counts
+        if counts is not None: # evidence given as numbers, and not updated since
+            return {x:counts[x] for x in Agent.Context.Alternatives}
+        return {x:Agent.amount(x) for x in Agent.Context.Alternatives}
+    return Agent.cached('counts', compute)
+
+def countVector(Agent):
+    """
+        Returns the evidence amounts of Agent as an integer array, indexed as the alternatives
+        of the agent's context (see config.Context.index).
+
+        The result is cached by the agent until its evidence changes, and is read-only.
+    """
+    def compute():
+        row = Agent.countRow()
+        if row is None:
+            counts = cachedCounts(Agent)
+            alternatives = Agent.Context.Alternatives
+            row = np.fromiter((counts[x] for x in alternatives), dtype=np.int64, count=len(alternatives))
+        else: # a view into a profile's count array
+            row = row.view()
+        row.flags.writeable = False
+        return row
+    return Agent.cached('vector', compute)
 
 def ranks(Agent) -> dict:
     """
@@ -38,28 +77,52 @@ def ranks(Agent) -> dict:
 
         For instance {a:1, b:1, c:2, d:3} encodes the order a ~ b > c > d.
     """
-    values = sorted(list(set(evidenceCounts(Agent).values())))[::-1]
-    return {x:values.index(evidenceCounts(Agent)[x])+1 for x in config.Alternatives}
+    return dict(cachedRanks(Agent))
+
+def cachedRanks(Agent) -> dict:
+    """
+        Version of ranks that returns the dictionary cached by the agent until its evidence
+        changes, which must not be modified.
+    """
+    def compute():
+        values, position = np.unique(countVector(Agent), return_inverse=True) # values in increasing order
+        return dict(zip(Agent.Context.Alternatives, (len(values) - position).tolist()))
+    return Agent.cached('ranks', compute)
 
 def top(Agent) -> set:
     """
         Returns the top alternatives (i.e., those supported by most evidence) of Agent.
     """
-    return {x for x in config.Alternatives if ranks(Agent)[x] == min(ranks(Agent).values())}
+    return set(cachedTop(Agent))
+
+def cachedTop(Agent) -> frozenset:
+    """
+        Version of top that returns the set cached by the agent until its evidence changes.
+    """
+    def compute():
+        counts = cachedCounts(Agent)
+        best = max(counts.values())
+        return frozenset(x for x, c in counts.items() if c == best)
+    return Agent.cached('top', compute)
 
 def mostFrequent(List):
     """
         Returns set of elements of List that appear most often in List.
     """
-    counts = {x:List.count(x) for x in set(List)}
-    return {x for x in counts.keys() if counts[x] == max(counts.values())}
+    counts = collections.Counter(List)
+    maxCount = max(counts.values(), default=0)
+    return {x for x in counts.keys() if counts[x] == maxCount}
 
 def pluralityScores(Profile) -> dict:
     """
         Returns dictionary of plurality scores (i.e., number of times an alternative shows up on top)
         for each alternative.
     """
-    return {x: sum(map(lambda i: x in top(i), [i for i in Profile])) for x in config.Alternatives}
+    scores = {x:0 for x in Profile.Context.Alternatives}
+    for i in Profile:
+        for x in cachedTop(i):
+            scores[x] += 1
+    return scores
 
 def pluralityWinners(Profile) -> set:
     """
@@ -67,16 +130,18 @@ def pluralityWinners(Profile) -> set:
         i.e., that show up most often on top.
     """
     pScores = pluralityScores(Profile)
-    return {x for x in config.Alternatives if pScores[x] == max(pScores.values())}
+    maxScore = max(pScores.values())
+    return {x for x in Profile.Context.Alternatives if pScores[x] == maxScore}
 
 def unhappyAgents(Profile) -> set:
     """
         Returns alternatives that are unhappy with the plurality winners of given profile,
         i.e., that have some alternative they prefer to the plurality winners.
     """
-    return {i for i in Profile if i.unhappyWith(pluralityWinners(Profile))}
+    winners = pluralityWinners(Profile)
+    return {i for i in Profile if i.unhappyWith(winners)}
 
-def thereIsSomethingToDisclose(Input, Outcome, PublicEvidence) -> dict():
+def thereIsSomethingToDisclose(Input, Outcome, PublicEvidence, Index=None) -> dict():
     """
         Input should be either an Agent type or Profile type.
 
@@ -84,29 +149,31 @@ def thereIsSomethingToDisclose(Input, Outcome, PublicEvidence) -> dict():
         Values are dictionaries whose keys are alternatives the agent prefers to Outcome, 
         and values are items of evidence that the agent possesses in facor of those 
         alternatives and that are not already public.
+
+        Index, if given, is a classes.PrivateEvidence index over PublicEvidence,
+        used to find the private items of agents.
     """
     if Outcome == set():
         return dict()
         
     if isinstance(Input, classes.Agent):
         Agent = Input
-        betterAlternatives = Agent.preferredTo(Outcome)
-        if betterAlternatives:
-            if any(x for x in betterAlternatives if any(e for e in Agent.evidence[x] if e not in PublicEvidence[x])):
-                return {
-                    Agent: {
-                        x: {
-                            e for e in Agent.evidence[x] if e not in PublicEvidence[x]
-                            } for x in betterAlternatives if {e for e in Agent.evidence[x] if e not in PublicEvidence[x]}
-                        }
-                    }
-        return dict()
+        privateEvidence = dict()
+        for x in Agent.preferredTo(Outcome):
+            if Index is not None:
+                items = Index.private(Agent, x)
+            else:
+                items = {e for e in Agent.evidence[x] if e not in PublicEvidence[x]}
+            if items:
+                privateEvidence[x] = items
+        return {Agent: privateEvidence} if privateEvidence else dict()
 
     if isinstance(Input, classes.Profile):
         Profile = Input
-        return {
-            i:thereIsSomethingToDisclose(i, Outcome, PublicEvidence)[i] for i in Profile if thereIsSomethingToDisclose(i, Outcome, PublicEvidence)
-            }
+        disclosers = dict()
+        for i in Profile:
+            disclosers.update(thereIsSomethingToDisclose(i, Outcome, PublicEvidence, Index))
+        return disclosers
     
     return None
 
@@ -123,18 +190,35 @@ def prettyViewAgent(AgentId, EvidenceCountDict):
     rowLength = 50
     prefix = '0{id}: '.format(id = AgentId) if AgentId < 10 else '{id}: '.format(id = AgentId)
 
-    x = config.Alternatives[0]
+    alternatives = list(EvidenceCountDict.keys())
+    x = alternatives[0]
     s = prefix + '-'* EvidenceCountDict[x] + str(x)
     s += ' '*(rowLength - len(s)) + '[{e}]'.format(e = EvidenceCountDict[x]) + '\n'
 
-    for i in range(1, len(config.Alternatives)):
-        x = config.Alternatives[i]
+    for i in range(1, len(alternatives)):
+        x = alternatives[i]
         evidenceBlock = '-'* EvidenceCountDict[x] + str(x) 
         currentLength = len(prefix) + len(evidenceBlock)
         row = ' '*len(prefix) + evidenceBlock + ' '*(rowLength - currentLength) + '[{e}]'.format(e = EvidenceCountDict[x]) + '\n'
         s += row
     return s
 
+def evidenceSize(Evidence) -> int:
+    """
+        Returns the amount of evidence in an entry of a profile snapshot, which is
+        either a set of items (set-based engine) or a number (count-based engine).
+    """
+    return Evidence if isinstance(Evidence, int) else len(Evidence)
+
+def prettyViewProfile(snapshot):
+    """
+        Returns the agents of a profile snapshot (as in Deliberation.History), one after the other.
+    """
+    s = ''
+    for i in snapshot.keys():
+        s += prettyViewAgent(i, {x: evidenceSize(e) for x, e in snapshot[i].items()}) +'\n'
+    return s
+
 def prettyViewHistory(history):
     s = '{type} protocol\n\n'.format(type = history[0]['type'])
 
@@ -142,9 +226,8 @@ def prettyViewHistory(history):
         for r in history.keys():
             s += '\tRound {round}\n'.format(round = r)
             if r == 0:
-                s += 'Initial profile:\n\n'
-                for i in history[r]['profile at round end'].keys():
-                    s += prettyViewAgent(i, {x: len(history[r]['profile at round end'][i][x]) for x in config.Alternatives}) +'\n'
+                if 'profile at round end' in history[r]: # not recorded in summary histories
+                    s += 'Initial profile:\n\n' + prettyViewProfile(history[r]['profile at round end'])
 
             if r > 0:
                 nominees = []
@@ -170,9 +253,8 @@ def prettyViewHistory(history):
                 ) 
                 
                 if len(history[r]['disclosers'].keys()) > 0:
-                    s+= '\nProfile after updates:\n\n'
-                    for i in history[r]['profile at round end'].keys():
-                        s += prettyViewAgent(i, {x: len(history[r]['profile at round end'][i][x]) for x in config.Alternatives}) +'\n' 
+                    if 'profile at round end' in history[r]:
+                        s+= '\nProfile after updates:\n\n' + prettyViewProfile(history[r]['profile at round end'])
                 else:    
                     s += 'No unhappy agents that have something to disclose. We stop.\n'
                     s += 'Final winners: {w}.'.format(
@@ -183,9 +265,8 @@ def prettyViewHistory(history):
         for r in history.keys():
             s += '\tRound {round}\n'.format(round = r)
             if r == 0:
-                s += 'Initial profile:\n\n'
-                for i in history[r]['profile at round end'].keys():
-                    s += prettyViewAgent(i, {x: len(history[r]['profile at round end'][i][x]) for x in config.Alternatives}) +'\n'
+                if 'profile at round end' in history[r]: # not recorded in summary histories
+                    s += 'Initial profile:\n\n' + prettyViewProfile(history[r]['profile at round end'])
 
             if r > 0:
                 s += 'Current winners: {W}\n\n'.format(
@@ -199,9 +280,8 @@ def prettyViewHistory(history):
                         )
                 
                 if len(history[r]['disclosers'].keys()) > 0:
-                    s+= '\nProfile after updates:\n\n'
-                    for i in history[r]['profile at round end'].keys():
-                        s += prettyViewAgent(i, {x: len(history[r]['profile at round end'][i][x]) for x in config.Alternatives}) +'\n' 
+                    if 'profile at round end' in history[r]:
+                        s+= '\nProfile after updates:\n\n' + prettyViewProfile(history[r]['profile at round end'])
                 else:    
                     s += 'No unhappy agents that have something to disclose. We stop.\n'
                     s += 'Final winners: {w}.'.format(
@@ -230,16 +310,83 @@ def partitions(n, E, parent=tuple()):
     else:
         yield parent + (E,)
 
+def wilsonHalfWidth(successes, trials, confidence=0.95) -> float:
+    """
+        Half-width of the Wilson score interval for a success rate of successes out of trials.
+    """
+    if trials == 0:
+        return float('inf')
+    z = ss.norm.ppf(0.5 + confidence/2)
+    p = successes/trials
+    return z/(1 + z**2/trials) * math.sqrt(p*(1-p)/trials + z**2/(4*trials**2))
+
+def meanHalfWidth(total, totalOfSquares, trials, confidence=0.95) -> float:
+    """
+        Half-width of the normal approximation interval for the mean of trials values,
+        given their sum and the sum of their squares.
+    """
+    if trials < 2:
+        return float('inf')
+    z = ss.norm.ppf(0.5 + confidence/2)
+    variance = max(totalOfSquares - total**2/trials, 0)/(trials - 1)
+    return z * math.sqrt(variance/trials)
+
+def hasVariance(p, E, desiredVariance = 'low') -> bool:
+    """
+        Whether the partition p of E has 'low' or 'high' variance, as understood by varPartitions.
+        desiredVariance=None accepts every partition.
+    """
+    if desiredVariance is None:
+        return True
+    maxVar = np.var([E] + [0]*(len(p)-1))
+    if desiredVariance == 'low':
+        return np.var(p) <= maxVar/8
+    if desiredVariance == 'high':
+        return np.var(p) >= (2/3)*maxVar
+    return False
+
 def varPartitions(n, E, desiredVariance = 'low'):
-    maxVar = np.var([E] + [0]*(n-1))
-    cut1, cut2 = maxVar/8, (2/3)*maxVar
     for p in partitions(n, E):
-        v = np.var(p)
-        if desiredVariance == 'low' and np.var(p)<= cut1:
-            yield p
-        if desiredVariance == 'high' and np.var(p) >= cut2:
+        if hasVariance(p, E, desiredVariance):
             yield p
 
+def pairPartitions(n, A, B):
+    """
+        n, number of agents
+        A, B, amounts of evidence for a and b to be divided among the n agents
+
+        Produces the pairs (aDist, bDist) of partitions(n, A) and partitions(n, B) up to 
+        permutations of the agents: agent j gets (aDist[j], bDist[j]), and only the 
+        permutation in which these are in decreasing order is produced, together with 
+        its multiplicity, i.e., the number of distinct permutations of it.
+    """
+    for aDist, bDist in _sortedPairs(n, A, B, (A, B)):
+        yield aDist, bDist, multiplicity(list(zip(aDist, bDist)))
+
+def _sortedPairs(n, A, B, largest):
+    # decreasing sequences of n pairs, each at most largest, adding up to (A, B)
+    if n == 1:
+        if (A, B) <= largest:
+            yield (A,), (B,)
+        return
+    for a in range(min(A, largest[0]), -1, -1):
+        if A - a > (n-1)*a:
+            break
+        for b in range(B if a < largest[0] else min(B, largest[1]), -1, -1):
+            if a == 0 and B - b > (n-1)*b:
+                break
+            for aRest, bRest in _sortedPairs(n-1, A-a, B-b, (a, b)):
+                yield (a,) + aRest, (b,) + bRest
+
+def multiplicity(List) -> int:
+    """
+        Number of distinct permutations of List.
+    """
+    m = math.factorial(len(List))
+    for count in collections.Counter(List).values():
+        m //= math.factorial(count)
+    return m
+
 def randomSlicing(S, n, minShare, maxShare, startShare=0):
     """
         Returns a list of n random integers in the interval [minShare, maxShare] with sum S.
@@ -266,24 +413,106 @@ def randomSlicing(S, n, minShare, maxShare, startShare=0):
     d[n-1] = S
     return d
 
+EXACT_TABLE_LIMIT = 10**5 # largest n*(T+1) for which compositionTables counts exactly, which takes about a second
+
+@functools.lru_cache(maxsize=64)
+def compositionTables(S, n, minShare, maxShare):
+    """
+        Counting tables for the lists of n integers in [minShare, maxShare] with sum S 
+        whose last value is positive (see randomConstrained), or None if there are none.
+
+        Values are counted in excess of minShare, so that the list adds up to T = S - n*minShare.
+        Returns a dictionary with:
+            'prefix': prefix[k][t] is the number of ways the last k values can add up to
+                at most t (in excess of minShare), for t in 0..T;
+            'scaled': scaled[k][t] is the number of ways they can add up to exactly t, 
+                divided by the largest such number, as a float array (used for batches).
+
+        The numbers have hundreds of digits once n is in the hundreds, and counting them exactly
+        takes minutes, so if n*(T+1) exceeds EXACT_TABLE_LIMIT the dictionary instead holds
+            'log': log[k][t], the natural logarithm of the number of ways the last k values can
+                add up to exactly t, as a float array, -inf where there are none;
+        and sampling from it is exact up to floating point precision.
+
+        Results are cached for every (S, n, minShare, maxShare).
+    """
+    T, width = S - n*minShare, maxShare - minShare
+    if n < 1 or T < 0 or width < 0 or T > n*width:
+        return None
+
+    if n*(T+1) > EXACT_TABLE_LIMIT:
+        return logCompositionTables(T, n, minShare, width)
+
+    lastMin = max(minShare, 1) - minShare # the last value has to be positive
+    ways = [None, [1 if lastMin <= t <= width else 0 for t in range(T+1)]]
+    prefix = [None, list(itertools.accumulate(ways[1]))]
+    for k in range(2, n+1):
+        p = prefix[k-1]
+        ways.append([p[t] - (p[t-width-1] if t-width-1 >= 0 else 0) for t in range(T+1)])
+        prefix.append(list(itertools.accumulate(ways[k])))
+
+    if ways[n][T] == 0:
+        return None
+
+    return {
+        'prefix': prefix,
+        'scaled': [None] + [np.array([w / max(max(ways[k]), 1) for w in ways[k]]) for k in range(1, n+1)]
+        }
+
+def logCompositionTables(T, n, minShare, width):
+    """
+        Version of compositionTables with logarithms of the numbers of ways, see there.
+    """
+    lastMin = max(minShare, 1) - minShare # the last value has to be positive
+    if lastMin > min(width, T):
+        return None
+
+    t = np.arange(T+1)
+    logWays = [None, np.where((t >= lastMin) & (t <= width), 0.0, -np.inf)]
+    for k in range(2, n+1):
+        previous, row = logWays[k-1], np.full(T+1, -np.inf)
+        for e in range(min(width, T)+1): # the k-th value from the end takes excess e
+            row[e:] = np.logaddexp(row[e:], previous[:T+1-e])
+        logWays.append(row)
+    return {'log': logWays}
+
 def randomConstrained(S, n, minShare, maxShare, startShare=0):
     """
         Returns a list of n random integers in the interval [minShare, maxShare] with sum S.
-    """
 
-    hit = False
-    while not hit:
-        total, count = 0, 0
-        nums = []
-        while total < S and count < n:
-            r = random.randint(minShare, maxShare)
-            total += r
-            count += 1
-            nums.append(r)
+        Lists are drawn uniformly among those whose last value is positive, which is what
+        drawing uniform values in [minShare, maxShare] until there are n of them adding up 
+        to exactly S would give (for minShare >= 0). No draw is rejected: values are drawn
+        one after the other, each with probability proportional to the number of ways of
+        completing the list (see compositionTables), in O(log S) per value; for large n and S,
+        where the tables hold logarithms, up to floating point precision and in 
+        O(maxShare - minShare) per value.
 
-        if total == S and count == n: 
-            hit = True
-    return nums
+        Returns None if there is no such list.
+    """
+    tables = compositionTables(S, n, minShare, maxShare)
+    if tables is None:
+        return None
+
+    width = maxShare - minShare
+    t = S - n*minShare # what is left to distribute, in excess of minShare
+    d = []
+    for k in range(n, 1, -1):
+        # the remaining k-1 values add up to some u in [t - width, t], with weight the number of ways to do so
+        low = max(t - width, 0)
+        if 'prefix' in tables:
+            prefix = tables['prefix'][k-1]
+            below = prefix[low-1] if low > 0 else 0
+            r = random.randrange(prefix[t] - below)
+            u = bisect.bisect_right(prefix, below + r, low, t+1)
+        else:
+            window = tables['log'][k-1][low:t+1].tolist()
+            best = max(window)
+            u = random.choices(range(low, t+1), [math.exp(w - best) for w in window])[0]
+        d.append(minShare + t - u)
+        t = u
+    d.append(minShare + t)
+    return d
 
 def randomIncrement(S, n, minShare, maxShare, startShare=0):
     """
@@ -325,4 +554,138 @@ def randomDeviate(S, n, minShare, maxShare, startShare):
 
         if minShare <= d[i] + x <= maxShare:
             d[i] += x
-    return d
\ No newline at end of file
+    return d
+
+def pickAmong(Mask, rng):
+    """
+        Mask is a boolean array of shape (trials, k). Returns, for every row, the index of 
+        one of its True entries, picked uniformly at random. Every row needs a True entry.
+    """
+    cumulative = np.cumsum(Mask, axis=1)
+    r = np.floor(rng.random(Mask.shape[0]) * cumulative[:, -1]).astype(np.int64)
+    return (cumulative > r[:, None]).argmax(axis=1)
+
+def randomSlicingBatch(S, n, minShare, maxShare, startShare=0, trials=1, rng=None):
+    """
+        Batched version of randomSlicing: returns an integer array of shape (trials, n),
+        whose rows are distributed like the output of randomSlicing.
+
+        rng is a numpy.random.Generator, or a seed for one.
+    """
+    if n*minShare > S or n*maxShare < S:
+        return None
+
+    rng = np.random.default_rng(rng)
+    d = np.zeros((trials, n), dtype=np.int64)
+    remaining = np.full(trials, S, dtype=np.int64)
+    for i in range(n-1):
+        # same cases as randomSlicing, where a later case overrides an earlier one
+        low, high = np.full(trials, minShare), np.full(trials, maxShare)
+        middle = (minShare < remaining) & (remaining < maxShare)
+        high = np.where(middle, remaining, high)
+        small = remaining <= minShare
+        low, high = np.where(small, 0, low), np.where(small, remaining, high)
+
+        d[:, i] = rng.integers(low, high + 1)
+        remaining -= d[:, i]
+    d[:, n-1] = remaining
+    return d
+
+def randomConstrainedBatch(S, n, minShare, maxShare, startShare=0, trials=1, rng=None):
+    """
+        Batched version of randomConstrained: returns an integer array of shape (trials, n),
+        whose rows are distributed like the output of randomConstrained (up to floating point
+        precision in the probability of each value).
+
+        rng is a numpy.random.Generator, or a seed for one.
+    """
+    tables = compositionTables(S, n, minShare, maxShare)
+    if tables is None:
+        return None
+
+    rng = np.random.default_rng(rng)
+    width = maxShare - minShare
+    d = np.zeros((trials, n), dtype=np.int64)
+    t = np.full(trials, S - n*minShare, dtype=np.int64)
+    excess = np.arange(width + 1)
+    for i, k in enumerate(range(n, 1, -1)):
+        # weight of giving excess e to this value: number of ways the remaining k-1 values add up to t - e
+        rest = t[:, None] - excess[None, :]
+        if 'scaled' in tables:
+            weights = np.where(rest >= 0, tables['scaled'][k-1][np.maximum(rest, 0)], 0)
+        else:
+            logs = np.where(rest >= 0, tables['log'][k-1][np.maximum(rest, 0)], -np.inf)
+            weights = np.exp(logs - logs.max(axis=1, keepdims=True))
+        cumulative = np.cumsum(weights, axis=1)
+        r = rng.random(trials) * cumulative[:, -1]
+        e = (cumulative > r[:, None]).argmax(axis=1)
+        d[:, i] = minShare + e
+        t -= e
+    d[:, n-1] = minShare + t
+    return d
+
+def randomIncrementBatch(S, n, minShare, maxShare, startShare=0, trials=1, rng=None):
+    """
+        Batched version of randomIncrement: returns an integer array of shape (trials, n),
+        whose rows are distributed like the output of randomIncrement.
+
+        Picking a value at random until one below maxShare comes up amounts to picking
+        uniformly among the values below maxShare, which is what every step does here.
+        If maxShare can never be reached, the increments are multinomial.
+
+        rng is a numpy.random.Generator, or a seed for one.
+    """
+    if n*minShare > S or n*maxShare < S:
+        return None
+
+    rng = np.random.default_rng(rng)
+    increments = S - n*minShare
+    if maxShare - minShare >= increments:
+        return minShare + rng.multinomial(increments, [1/n]*n, size=trials)
+
+    d = np.full((trials, n), minShare, dtype=np.int64)
+    rows = np.arange(trials)
+    for step in range(increments):
+        d[rows, pickAmong(d < maxShare, rng)] += 1
+    return d
+
+def randomDeviateBatch(S, n, minShare, maxShare, startShare, trials=1, rng=None):
+    """
+        Batched version of randomDeviate: returns an integer array of shape (trials, n),
+        whose rows are distributed like the output of randomDeviate.
+
+        Steps of randomDeviate that would leave [minShare, maxShare] change nothing, so every
+        step here picks uniformly among the moves that stay within bounds. Trials leave the
+        batch as soon as their values add up to S.
+
+        rng is a numpy.random.Generator, or a seed for one.
+    """
+    minShare, maxShare, startShare = max(minShare, 0), min(maxShare, S), max(startShare, 0)
+
+    if startShare*n > S or maxShare*n < S or minShare*n > S:
+        return None 
+
+    rng = np.random.default_rng(rng)
+    d = np.full((trials, n), startShare, dtype=np.int64)
+    active = np.flatnonzero(d.sum(axis=1) < S)
+    while active.size > 0:
+        current = d[active]
+        moves = np.concatenate([current + 1 <= maxShare, current - 1 >= minShare], axis=1) # up moves, then down moves
+        move = pickAmong(moves, rng)
+        d[active, move % n] += np.where(move < n, 1, -1)
+        active = active[d[active].sum(axis=1) < S]
+    return d
+
+# partition algorithms under the keys experiments refer to them by (see config.Context), and their batched versions
+PARTITION_ALGS = {
+    1: randomSlicing,
+    2: randomConstrained,
+    3: randomIncrement,
+    4: randomDeviate
+}
+BATCH_PARTITION_ALGS = {
+    1: randomSlicingBatch,
+    2: randomConstrainedBatch,
+    3: randomIncrementBatch,
+    4: randomDeviateBatch
+}
@@ -0,0 +1,129 @@
+import os
+import sys
+import hashlib
+import inspect
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import numpy as np
+
+import store
+
+OBSERVERS = ('profile', 'recordDir') # keyword arguments that only observe a cell (see experiments.simulateAll)
+
+def cellSeed(seed, cell, function=None) -> int:
+    """
+        Returns the seed of cell (a dictionary of keyword arguments of function), derived from 
+        seed and the parameters of the cell (see store.encodeCell), with the defaults of function 
+        filled in, and leaving out OBSERVERS.
+
+        The seed only depends on seed and what the cell simulates, so a cell gets the same random
+        stream wherever it is in a grid, however many cells there are, whichever process evaluates 
+        it, whether defaults are given explicitly, and whether it is profiled or recorded.
+    """
+    if function is not None:
+        arguments = inspect.signature(function).bind_partial(**cell)
+        arguments.apply_defaults()
+        cell = {k:v for k, v in arguments.arguments.items() if k != 'seed'}
+    cell = {k:v for k, v in cell.items() if k not in OBSERVERS}
+    digest = hashlib.sha256(store.encodeCell(cell).encode()).digest()
+    key = tuple(int.from_bytes(digest[k:k+4], 'little') for k in range(0, 16, 4))
+    return int(np.random.SeedSequence(seed, spawn_key=key).generate_state(1)[0])
+
+def reportProgress(done, total, label='', unit='cells'):
+    """
+        Writes a progress line such as 'label: 3/60 cells'; total=None stands for an unknown number of units.
+    """
+    sys.stderr.write('\r{label}{done}{total} {unit}'.format(
+        label = label + ': ' if label else '', done = done, total = '' if total is None else '/' + str(total), unit = unit
+        ))
+    if done == total:
+        sys.stderr.write('\n')
+    sys.stderr.flush()
+
+def runCells(function, cells, workers=None, seed=None, progress=True, label='', store=None):
+    """
+        Evaluates function(**cell, seed=s) for every cell in cells (a list of dictionaries
+        of keyword arguments), and returns the results in the order of cells.
+
+        Cells are spread over a pool of workers processes (all cores, if workers is None).
+        With workers=1 everything runs in this process. Every cell gets its own seed
+        (see cellSeed), hence results are the same for any number of workers, and do not
+        change if cells are added to or removed from cells; seed=None draws fresh entropy, 
+        and results are not reproducible.
+
+        If store is a store.ResultStore, results are saved there as soon as they are done,
+        under label (or the name of function) and seed, and cells already in store are not
+        evaluated again. With seed=None stored results are reused as they are.
+
+        function must be defined at the top level of a module, so that workers can find it.
+        If progress is True, the number of finished cells is reported on stderr.
+    """
+    seeds = [cellSeed(seed, cell, function) for cell in cells]
+    results = [None]*len(cells)
+    workers = workers or os.cpu_count()
+    sweep = label or function.__name__
+
+    todo = []
+    for k, cell in enumerate(cells):
+        results[k] = store.get(sweep, cell, seed) if store is not None else None
+        if results[k] is None:
+            todo.append(k)
+    done = len(cells) - len(todo)
+
+    def finish(k, result):
+        nonlocal done
+        results[k] = result
+        if store is not None:
+            store.put(sweep, cells[k], seed, result)
+        done += 1
+        if progress:
+            reportProgress(done, len(cells), label)
+
+    if workers == 1 or len(todo) <= 1:
+        for k in todo:
+            finish(k, function(**cells[k], seed=seeds[k]))
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(function, **cells[k], seed=seeds[k]):k for k in todo}
+        for future in as_completed(futures):
+            finish(futures[future], future.result())
+    return results
+
+def streamCells(function, cells, workers=None, backlog=None, progress=True, label=''):
+    """
+        Evaluates function(**cell) for every cell in cells, an iterable of dictionaries of 
+        keyword arguments that can be too long to hold in memory, and yields the results 
+        as they come, in no particular order.
+
+        Cells are consumed lazily: at most backlog cells (twice the number of workers, 
+        if None) are waiting or running at any time. With workers=1 everything runs in 
+        this process, in order. No seeds are passed: this is meant for deterministic work.
+    """
+    workers = workers or os.cpu_count()
+    done = 0
+
+    if workers == 1:
+        for cell in cells:
+            yield function(**cell)
+            done += 1
+            if progress:
+                reportProgress(done, None, label)
+        if progress:
+            sys.stderr.write('\n')
+        return
+
+    cells = iter(cells)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(function, **cell) for cell in itertools.islice(cells, backlog or 2*workers)}
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+                done += 1
+                if progress:
+                    reportProgress(done, None, label)
+            pending |= {pool.submit(function, **cell) for cell in itertools.islice(cells, len(finished))}
+    if progress:
+        sys.stderr.write('\n')
@@ -0,0 +1,92 @@
+import os
+import glob
+import uuid
+import numpy as np
+
+class TrialRecords:
+    """
+        Sink for per-trial records (see experiments.simulateAll), written column by column
+        to chunked .npz files in directory.
+
+        Rows given to write() are buffered, and every chunkSize rows (and on close) they are
+        written out as a file holding one compressed array per column, so memory stays bounded
+        however many trials are recorded. A column with the same value in every row of a chunk,
+        e.g., the parameters of a cell, is stored once. A file only appears once it is complete. Several
+        writers, e.g., the worker processes of a sweep, can share a directory, as every writer
+        names its files with a token of its own.
+
+        Every write() is expected to give the same columns. Use loadColumns or readChunks
+        to read them back.
+    """
+    def __init__(self, directory, chunkSize=100000) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunkSize = chunkSize
+        self.token = uuid.uuid4().hex[:12]
+        self.buffer = dict() # column -> list of arrays, or of single values, one for every write
+        self.sizes = [] # number of rows of every write
+        self.rows = 0
+        self.nrChunks = 0
+
+    def write(self, **columns) -> None:
+        """
+            Adds rows: every column is an array with a value per row, or a single value for all rows.
+        """
+        arrays = {name:np.asarray(values) for name, values in columns.items()}
+        size = max((len(a) for a in arrays.values() if a.ndim > 0), default=1)
+        for name, a in arrays.items():
+            self.buffer.setdefault(name, []).append(a)
+        self.sizes.append(size)
+        self.rows += size
+        if self.rows >= self.chunkSize:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.rows == 0:
+            return
+        path = os.path.join(self.directory, 'chunk-{token}-{k:05d}.npz'.format(token = self.token, k = self.nrChunks))
+        columns = {'_rows': np.asarray(self.rows)}
+        for name, arrays in self.buffer.items():
+            if all(a.ndim == 0 and a == arrays[0] for a in arrays):
+                columns[name] = arrays[0]
+            else:
+                columns[name] = np.concatenate([a if a.ndim > 0 else np.full(size, a) for a, size in zip(arrays, self.sizes)])
+        with open(path + '.part', 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(path + '.part', path)
+        self.buffer, self.sizes, self.rows = dict(), [], 0
+        self.nrChunks += 1
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+def chunkPaths(directory) -> list:
+    return sorted(glob.glob(os.path.join(directory, 'chunk-*.npz')))
+
+def readChunks(directory, columns=None):
+    """
+        Yields the chunks written by TrialRecords in directory, one at a time, as dictionaries
+        from column names to arrays; only columns are read (all of them if None).
+    """
+    for path in chunkPaths(directory):
+        with np.load(path) as chunk:
+            rows = int(chunk['_rows'])
+            names = columns or [name for name in chunk.files if name != '_rows']
+            yield {name:(chunk[name] if chunk[name].ndim > 0 else np.full(rows, chunk[name])) for name in names}
+
+def loadColumns(directory, columns=None) -> dict:
+    """
+        Returns columns (all of them if None) of all records in directory, as a dictionary of arrays;
+        other columns are not read.
+    """
+    loaded = dict()
+    for chunk in readChunks(directory, columns):
+        for name, values in chunk.items():
+            loaded.setdefault(name, []).append(values)
+    return {name:np.concatenate(values) for name, values in loaded.items()}
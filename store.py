@@ -0,0 +1,75 @@
+import json
+import sqlite3
+import config
+
+def encodeCell(cell) -> str:
+    """
+        Canonical text for a cell (a dictionary of keyword arguments, see parallel.runCells):
+        functions, e.g., partition algorithms, are replaced by their names, contexts by their
+        alternatives, tuples by lists.
+    """
+    def encode(value):
+        if isinstance(value, config.Context):
+            return {'alternatives': encode(value.Alternatives)}
+        if callable(value):
+            return value.__name__
+        if isinstance(value, dict):
+            return {str(k):encode(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(v) for v in value]
+        if hasattr(value, 'item'): # numpy scalars
+            return value.item()
+        return value
+    return json.dumps(encode(cell), sort_keys=True)
+
+class ResultStore:
+    """
+        Results of sweep cells, kept in an sqlite database at path.
+
+        A result is stored under the name of the sweep, the parameters of the cell (protocol,
+        agent type, A, B, n, shares, partition algorithm, trials, ...) and the seed of the sweep,
+        as soon as the cell is done, so that a sweep that is run again, e.g., after a crash,
+        only computes the cells that are missing (see parallel.runCells).
+
+        Results have to be dictionaries that json can write, e.g., those of experiments.simulate.
+    """
+    def __init__(self, path='results.sqlite') -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'sweep TEXT NOT NULL, cell TEXT NOT NULL, seed TEXT NOT NULL, result TEXT NOT NULL, '
+            'PRIMARY KEY (sweep, cell, seed))'
+            )
+        self.connection.commit()
+
+    @staticmethod
+    def key(sweep, cell, seed) -> tuple:
+        return (sweep, encodeCell(cell), json.dumps(seed))
+
+    def get(self, sweep, cell, seed):
+        """
+            Returns the result stored for cell in sweep with seed, or None.
+        """
+        row = self.connection.execute(
+            'SELECT result FROM results WHERE sweep = ? AND cell = ? AND seed = ?', self.key(sweep, cell, seed)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, sweep, cell, seed, result) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO results (sweep, cell, seed, result) VALUES (?, ?, ?, ?)',
+            self.key(sweep, cell, seed) + (json.dumps(result),)
+            )
+        self.connection.commit()
+
+    def results(self, sweep=None) -> list:
+        """
+            Returns all stored results (of sweep, if given), as tuples (sweep, cell, seed, result).
+        """
+        query = 'SELECT sweep, cell, seed, result FROM results' + (' WHERE sweep = ?' if sweep is not None else '')
+        rows = self.connection.execute(query, (sweep,) if sweep is not None else ())
+        return [(s, json.loads(c), json.loads(k), json.loads(r)) for s, c, k, r in rows]
+
+    def close(self) -> None:
+        self.connection.close()
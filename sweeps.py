@@ -0,0 +1,28 @@
+import itertools
+import parallel
+
+def grid(**axes) -> list:
+    """
+        Returns the points of the grid spanned by axes, as dictionaries, the first axis varying slowest:
+        grid(n=[10, 15], A=range(31, 91)) gives {'n':10, 'A':31}, {'n':10, 'A':32}, ..., {'n':15, 'A':90}.
+    """
+    names = list(axes.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[list(axes[name]) for name in names])]
+
+def run(function, points, cell, name='', workers=None, seed=None, store=None, progress=True) -> list:
+    """
+        Evaluates function at every point of a grid, and returns the results in the order of points:
+        cell(point) gives the keyword arguments of function at point. Points are spread over workers
+        processes, get their own seeds, and are kept in store, see parallel.runCells.
+    """
+    return parallel.runCells(
+        function, [cell(point) for point in points],
+        workers=workers, seed=seed, progress=progress, label=name, store=store
+        )
+
+def series(points, results, **fixed) -> list:
+    """
+        Returns the results at the points whose coordinates are as in fixed, in the order of points:
+        series(points, results, n=10) is the line of the grid along the axes other than n, at n = 10.
+    """
+    return [result for point, result in zip(points, results) if all(point[k] == v for k, v in fixed.items())]
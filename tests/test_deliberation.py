@@ -0,0 +1,56 @@
+import numpy as np
+
+import config
+import classes
+
+CONTEXT = config.Context(['a', 'b', 'c'])
+
+def profile(counts, types):
+    return classes.Profile.fromCounts(np.array(counts), types, CONTEXT)
+
+def test_str_without_history():
+    counts, types = [[3, 1, 0], [0, 2, 1], [1, 0, 4]], ['keen', 'lazy', 'keen']
+    full = classes.Deliberation(profile(counts, types))
+    assert str(full).startswith('sim protocol')
+
+    summary = classes.Deliberation(profile(counts, types), HistoryLevel='none')
+    assert "HistoryLevel 'none'" in str(summary)
+    assert ', '.join(sorted(full.finalWinners)) in str(summary)
+
+    cache = classes.OutcomeCache()
+    classes.Deliberation(profile(counts, types), HistoryLevel='none', Cache=cache)
+    cached = classes.Deliberation(profile(counts, types), HistoryLevel='none', Cache=cache)
+    assert cache.hits == 1
+    assert 'outcome from cache' in str(cached)
+
+def test_cache_eviction_and_spill(tmp_path):
+    outcome = lambda k: (frozenset({'a'}), k, 2*k)
+
+    cache = classes.OutcomeCache(maxSize=2)
+    for k in range(3):
+        cache.put(('sim', k), outcome(k))
+    assert cache.get(('sim', 0)) is None # least recently used, dropped
+    assert cache.get(('sim', 2)) == outcome(2)
+    cache.put(('sim', 3), outcome(3)) # drops 1, not 2, which was just read
+    assert cache.get(('sim', 1)) is None and cache.get(('sim', 2)) == outcome(2)
+
+    cache = classes.OutcomeCache(maxSize=2, spill=str(tmp_path / 'outcomes'))
+    for k in range(5):
+        cache.put(('sim', k), outcome(k))
+    assert len(cache.outcomes) == 2
+    assert all(cache.get(('sim', k)) == outcome(k) for k in range(5)) # 0 to 2 read back from the spill file
+    assert (cache.hits, cache.misses) == (5, 0)
+    cache.close()
+
+def test_cache_spill_outcomes_reused(tmp_path):
+    cases = [([[3, 1, 0], [0, 2, 1], [1, 0, 4]], ['keen', 'lazy', 'keen']), ([[0, 5, 1], [2, 2, 2]], ['lazy', 'lazy']), ([[1, 1, 3]], ['keen'])]
+    expected = [classes.Deliberation(profile(c, t), HistoryLevel='none') for c, t in cases]
+
+    cache = classes.OutcomeCache(maxSize=1, spill=str(tmp_path / 'outcomes'))
+    for c, t in cases:
+        classes.Deliberation(profile(c, t), HistoryLevel='none', Cache=cache)
+    cached = [classes.Deliberation(profile(c, t), HistoryLevel='none', Cache=cache) for c, t in cases]
+    assert cache.hits == len(cases)
+    for D, E in zip(cached, expected):
+        assert (D.finalWinners, D.nrRounds, D.nrDisclosures) == (E.finalWinners, E.nrRounds, E.nrDisclosures)
+    cache.close()
@@ -0,0 +1,121 @@
+import os
+import json
+import random
+import collections
+
+import numpy as np
+import pytest
+
+import config
+import classes
+import engines
+import helpers
+import experiments
+
+# Seeded differential checks: optimized code paths against the ones they replace.
+#
+# baseline_outcomes.json holds random profiles (of 1 to 8 agents, over 2 to 4 alternatives)
+# with the final winners and number of rounds that the original implementation, before any
+# engine, cache or batch, gave for 'sim' and 'seq-const'.
+
+CONTEXT = config.Context(['a', 'b', 'c'])
+
+def randomCounts(rng):
+    """
+        Counts of a random profile of 2 to 7 agents, some of them with no evidence for some alternatives.
+    """
+    n = int(rng.integers(2, 8))
+    counts = rng.integers(0, int(rng.integers(2, 10)), size=(n, len(CONTEXT.Alternatives)))
+    return counts * (rng.random(counts.shape) < rng.uniform(0.3, 1))
+
+def randomTypes(rng, n):
+    return [str(t) for t in rng.choice(['lazy', 'keen'], size=n)]
+
+def buildProfile(counts, types, fromCounts):
+    if fromCounts:
+        return classes.Profile.fromCounts(counts, types, CONTEXT)
+    return classes.Profile(
+        [classes.Agent(id = j+1, evidence = dict(zip(CONTEXT.Alternatives, map(int, row))), type = t, Context = CONTEXT) for j, (row, t) in enumerate(zip(counts, types))],
+        CONTEXT
+        )
+
+@pytest.mark.parametrize('engine', ['sets', 'counts'])
+@pytest.mark.parametrize('fromCounts', [False, True])
+def test_early_stop_keeps_winners(engine, fromCounts):
+    rng = np.random.default_rng(25)
+    for _ in range(300):
+        counts = randomCounts(rng)
+        types = randomTypes(rng, len(counts))
+        full = classes.Deliberation(buildProfile(counts, types, fromCounts), 'sim', engine, HistoryLevel='none')
+        early = classes.Deliberation(buildProfile(counts, types, fromCounts), 'sim', engine, HistoryLevel='none', EarlyStop=True)
+        assert early.finalWinners == full.finalWinners
+        assert early.nrRounds <= full.nrRounds
+        if not early.stoppedEarly:
+            assert (early.nrRounds, early.nrDisclosures) == (full.nrRounds, full.nrDisclosures)
+
+def test_early_stop_reviewed_case():
+    counts = [[4, 2, 5], [0, 3, 4], [5, 3, 2], [1, 2, 2], [4, 5, 0]]
+    for engine in ['sets', 'counts']:
+        full = classes.Deliberation(classes.Profile.fromCounts(counts, 'keen', CONTEXT), 'sim', engine, HistoryLevel='none')
+        early = classes.Deliberation(classes.Profile.fromCounts(counts, 'keen', CONTEXT), 'sim', engine, HistoryLevel='none', EarlyStop=True)
+        assert early.finalWinners == full.finalWinners == {'a'}
+
+def baselineCases():
+    with open(os.path.join(os.path.dirname(__file__), 'baseline_outcomes.json')) as f:
+        return json.load(f)
+
+@pytest.mark.parametrize('engine', ['sets', 'counts'])
+@pytest.mark.parametrize('fromCounts', [False, True])
+def test_engines_match_baseline(engine, fromCounts):
+    for case in baselineCases():
+        Context = config.Context(case['alternatives'])
+        for protocol, (winners, rounds) in case['outcomes'].items():
+            if fromCounts:
+                P = classes.Profile.fromCounts(case['counts'], case['types'], Context)
+            else:
+                P = classes.Profile(
+                    [classes.Agent(id = j+1, evidence = dict(zip(Context.Alternatives, row)), type = t, Context = Context) for j, (row, t) in enumerate(zip(case['counts'], case['types']))],
+                    Context
+                    )
+            D = classes.Deliberation(P, protocol, engine, HistoryLevel='summary')
+            assert (sorted(D.finalWinners), D.nrRounds) == (winners, rounds), (case, protocol)
+
+def test_batch_matches_baseline():
+    for case in baselineCases():
+        Context = config.Context(case['alternatives'])
+        winners, rounds = case['outcomes']['sim']
+        mask, batchRounds, _, _ = engines.simultaneousBatch(np.array([case['counts']]), case['types'], Context)
+        assert ([x for x, w in zip(Context.Alternatives, mask[0]) if w], int(batchRounds[0])) == (winners, rounds), case
+
+@pytest.mark.parametrize('key', sorted(helpers.BATCH_PARTITION_ALGS))
+def test_batched_samplers_match_scalar(key):
+    S, n, minShare, maxShare, startShare = 14, 3, 2, 8, 3
+    draws = 20000
+    random.seed(key)
+    scalar = collections.Counter(tuple(helpers.PARTITION_ALGS[key](S, n, minShare, maxShare, startShare)) for _ in range(draws))
+    batch = helpers.BATCH_PARTITION_ALGS[key](S, n, minShare, maxShare, startShare, trials=draws, rng=key)
+    batched = collections.Counter(map(tuple, batch.tolist()))
+    assert (batch.sum(axis=1) == S).all()
+    distance = sum(abs(scalar[d] - batched[d]) for d in set(scalar) | set(batched))/(2*draws) # total variation
+    assert distance < 0.06 # sampling noise is about 0.03, the distance between different algorithms 0.17 or more
+
+@pytest.mark.parametrize('protocol', ['sim', 'seq-const'])
+@pytest.mark.parametrize('agentType', ['lazy', 'keen'])
+def test_exact_simulate_matches_brute_force(protocol, agentType):
+    n, A, B = 3, 5, 4
+    Context = experiments.CONTEXT
+    successes, rounds, total = 0, 0, 0
+    for aDist in helpers.partitions(n, A):
+        for bDist in helpers.partitions(n, B):
+            P = classes.Profile(
+                [classes.Agent(id = j+1, evidence = {'a':aDist[j], 'b':bDist[j]}, type = agentType, Context = Context) for j in range(n)],
+                Context
+                )
+            D = classes.Deliberation(P, protocol, 'sets', HistoryLevel='none')
+            successes += D.finalWinners == {'a'}
+            rounds += D.nrRounds
+            total += 1
+    result = experiments.exactSimulate(protocol, agentType, n, A, B, chunkSize=50, workers=1, progress=False)
+    assert result['profiles'] == total
+    assert result['success rate'] == pytest.approx(successes/total)
+    assert result['average rounds'] == pytest.approx(rounds/total)
@@ -0,0 +1,21 @@
+import pytest
+
+import config
+import classes
+import helpers
+
+CONTEXT = config.Context(['a', 'b', 'c'])
+
+def test_helpers_return_copies():
+    agent = classes.Agent(id = 1, evidence = {'a':2, 'b':1, 'c':0}, type = 'keen', Context = CONTEXT)
+    assert agent.preferredTo({'a'}) == set()
+    helpers.top(agent).add('b')
+    helpers.evidenceCounts(agent)['b'] = 5
+    helpers.ranks(agent)['b'] = 1
+    with pytest.raises(ValueError):
+        helpers.countVector(agent)[1] = 5
+    assert helpers.top(agent) == {'a'}
+    assert helpers.evidenceCounts(agent) == {'a':2, 'b':1, 'c':0}
+    assert helpers.ranks(agent) == {'a':1, 'b':2, 'c':3}
+    assert agent.preferredTo({'a'}) == set()
+    assert agent.preferredTo({'b'}) == {'a'}
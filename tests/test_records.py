@@ -0,0 +1,28 @@
+import numpy as np
+
+import records
+
+def test_round_trip(tmp_path):
+    directory = str(tmp_path / 'records')
+    winners = np.arange(25) % 3
+    with records.TrialRecords(directory, chunkSize=10) as sink:
+        for k in range(5): # 5 writes of 5 rows, flushed as 10, 10 and 5 rows
+            sink.write(n = 7, trial = np.arange(5*k, 5*k + 5), winners = winners[5*k:5*k + 5], stop = k)
+    paths = records.chunkPaths(directory)
+    assert len(paths) == 3
+
+    with np.load(paths[0]) as chunk:
+        assert int(chunk['_rows']) == 10
+        assert chunk['n'].ndim == 0 and int(chunk['n']) == 7 # constant in the chunk, stored once
+        assert chunk['stop'].shape == (10,) # constant in each write, not in the chunk
+        assert chunk['trial'].shape == (10,)
+    with np.load(paths[2]) as chunk:
+        assert int(chunk['_rows']) == 5 and chunk['stop'].ndim == 0
+
+    columns = records.loadColumns(directory, ['trial', 'n', 'stop'])
+    assert set(columns) == {'trial', 'n', 'stop'}
+    assert np.array_equal(columns['trial'], np.arange(25))
+    assert np.array_equal(columns['n'], np.full(25, 7))
+    assert np.array_equal(columns['stop'], np.repeat(np.arange(5), 5))
+    assert np.array_equal(records.loadColumns(directory)['winners'], winners)
+    assert [len(chunk['trial']) for chunk in records.readChunks(directory, ['trial'])] == [10, 10, 5]
@@ -0,0 +1,40 @@
+import experiments
+import parallel
+import store
+import sweeps
+
+ALG = experiments.CONTEXT.BATCH_PARTITION_ALGS[4]
+
+def cell(point, **options):
+    n, A, B = point['n'], 50, 30
+    return dict(
+        n=n, A=A, B=B, aShares=((A//n)-2, (A//n)+2, (A//n)-1), bShares=((B//n)-2, (A//n)+2, (B//n)-1),
+        alg=ALG, trials=100, evaluations=[('sim', 'lazy'), ('seq-const', 'keen')], Context=experiments.CONTEXT, **options
+        )
+
+def test_resumed_sweep_matches_fresh_run(tmp_path):
+    fresh = sweeps.run(experiments.simulateAll, sweeps.grid(n=[8, 10, 12]), cell, name='test', workers=1, seed=0, progress=False)
+    results = store.ResultStore(str(tmp_path / 'results.sqlite'))
+    sweeps.run(experiments.simulateAll, sweeps.grid(n=[10, 12]), cell, name='test', workers=1, seed=0, store=results, progress=False)
+    resumed = sweeps.run(experiments.simulateAll, sweeps.grid(n=[8, 10, 12]), cell, name='test', workers=1, seed=0, store=results, progress=False)
+    results.close()
+    assert resumed == fresh
+
+def test_seed_ignores_defaults_and_observers(tmp_path):
+    point = {'n': 10}
+    seed = parallel.cellSeed(0, cell(point), experiments.simulateAll)
+    for options in [dict(halfWidth=None), dict(earlyStop=False), dict(profile=True), dict(recordDir=str(tmp_path))]:
+        assert parallel.cellSeed(0, cell(point, **options), experiments.simulateAll) == seed
+    assert parallel.cellSeed(0, dict(cell(point), trials=200), experiments.simulateAll) != seed
+
+    plain = parallel.runCells(experiments.simulateAll, [cell(point)], workers=1, seed=0, progress=False)
+    observed = parallel.runCells(experiments.simulateAll, [cell(point, profile=True, recordDir=str(tmp_path))], workers=1, seed=0, progress=False)
+    for result, observedResult in zip(plain[0], observed[0]):
+        assert {k:v for k, v in observedResult.items() if k != 'phases'} == result
+
+def test_results_report_half_width():
+    for target, halfWidth in [('success rate', 0.05), ('average rounds', 0.2)]:
+        results = experiments.simulateAll(**dict(cell({'n': 10}), trials=5000, halfWidth=halfWidth, target=target, batch=100, seed=0))
+        assert all(result['trials'] < 5000 and result['half width'] <= halfWidth for result in results)
+        capped = experiments.simulateAll(**dict(cell({'n': 10}), trials=100, halfWidth=0.001, target=target, seed=0))
+        assert all(result['trials'] == 100 and result['half width'] > 0.001 for result in capped)